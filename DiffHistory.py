@@ -4,26 +4,67 @@ from sublime_plugin import EventListener
 import time
 import datetime
 import os
-import json
 import concurrent.futures
-import DiffHistory.diff_match_patch as dmp_module
+import threading
+import bisect
+from DiffHistory.history_engine import history_engine as engine
 
 is_browsing_history = False
-TS_FORMAT = '%a., %b. %d, %Y, %I:%M %p'
+HISTORY_PAGE_SIZE = 50
+HISTORY_GROUP_THRESHOLD = 1000
+GROUP_FORMATS = ('%a., %b. %d, %Y', '%a., %b. %d, %Y, %I %p')
+RECENT_CHANGES_LIMIT = 200
+RENAME_CHECK_DELAY = 2000
+RENAME_CHECK_ATTEMPTS = 150
+GIT_IMPORT_WORKERS = 8
+EXPORT_EXTENSIONS = { 'patches': '.patch', 'states': '', 'git': '.git-export' }
+# processes to diff and replay in, off the plugin host; 0 for none.
+# Workers need a Python 3.8 interpreter to run under.
+WORKER_PROCESSES = 0
+WORKER_PYTHON = None
+
+# (old path, identity, window, attempts) of files being renamed
+pending_moves = []
+# whether follow_moves is scheduled; both guarded by moves_lock
+following_moves = False
+moves_lock = threading.Lock()
+# view id -> PhantomSet of blame annotations
+blame_phantoms = {}
+
+def plugin_loaded():
+    if WORKER_PROCESSES:
+        engine.start_workers(WORKER_PROCESSES, WORKER_PYTHON)
+    threading.Thread(
+        target=reconcile_folders, 
+        args=([folder for window in sublime.windows() for folder in window.folders()],),
+        daemon=True).start()
+
+def plugin_unloaded():
+    engine.stop_workers()
 
 class TakeSnapshot(EventListener):
 
     def __init__(self):
         self.last_time = time.time()
-        self.file_being_renamed = None
-        self.old_name = None
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=10) 
 
     def on_modified(self, view):
-        self.executor.submit(self.take_snapshot, view)
+        self.executor.submit(self.take_snapshot, view, 'on_modified')
 
     def on_post_save_async(self, view):
-        self.executor.submit(self.take_snapshot, view)
+        self.executor.submit(self.take_snapshot, view, 'on_post_save')
+
+    def on_activated_async(self, view):
+        self.executor.submit(check_disk, view, 'on_activated')
+
+    def on_load_async(self, view):
+        self.executor.submit(check_disk, view, 'on_load')
+
+    def on_reload_async(self, view):
+        self.executor.submit(check_disk, view, 'on_reload')
+
+    def on_load_project_async(self, window):
+        self.executor.submit(reconcile_folders, window.folders())
 
     def take_snapshot(self, view):
         global is_browsing_history
@@ -38,48 +79,32 @@ class TakeSnapshot(EventListener):
         self.last_time = now
         return True
 
-    def take_snapshot(self, view):
-        take_snapshot(
-            view.file_name(), 
-            view.substr(sublime.Region(0, view.size()))
-            )
+    def take_snapshot(self, view, trigger):
+        snapshot_view(
+            view, 
+            view.substr(sublime.Region(0, view.size())),
+            trigger)
+        if trigger == 'on_post_save': # disk now matches the history
+            engine.record_identity(view.file_name())
 
     def on_window_command(self, window, command_name, args):
         """
         Change the rename functionality here 
         instead of using built-in events. 
+        rename_path only opens an input panel, so the move is
+        followed up once the old path has gone. Renamed folders
+        carry their _diff directories with them.
         """
+        global following_moves
         if command_name == 'rename_path':
             old_name = args['paths'][0]
-            for v in window.views():
-                if v.file_name() == old_name:
-                    self.old_name = old_name
-                    self.view_being_renamed = v
-                return
-
-            if self.old_name:
-                new_filename = self.view_being_renamed.file_name()
-                old_history_file = os.path.join(
-                    os.path.dirname(self.old_name), 
-                    '_diff',
-                    os.path.basename(self.old_name) + '.diff')
-                
-                if os.path.exists(old_history_file):
-                    if not os.path.exists(os.path.join(
-                            os.path.dirname(new_filename),
-                            '_diff'
-                            )):
-                        os.mkdir(
-                            os.path.join(
-                                os.path.dirname(new_filename), 
-                                '_diff'))
-                    new_history_file = os.path.join(
-                        os.path.dirname(new_filename),
-                        '_diff',
-                        os.path.basename(new_filename) + '.diff')
-                    os.rename(old_history_file, new_history_file)
-            self.old_name = None
-            self.view_being_renamed = None
+            if os.path.isfile(old_name):
+                with moves_lock:
+                    pending_moves.append((old_name, engine.file_identity(old_name), window, 0))
+                    if following_moves:
+                        return # picked up by the running check
+                    following_moves = True
+                sublime.set_timeout_async(follow_moves, RENAME_CHECK_DELAY)
 
 class BrowseHistoryCommand(sublime_plugin.TextCommand):
 
@@ -92,26 +117,175 @@ class BrowseHistoryCommand(sublime_plugin.TextCommand):
                 return
             is_browsing_history = True
             self.existing_contents = self.view.substr(sublime.Region(0, self.view.size()))
-            take_snapshot(self.view.file_name(), self.existing_contents)
-            self.patch_changes = build_history_patches_with_deletions(
-                self.view.file_name(),
-                self.view.sel()[0].a)              
-            if not self.patch_changes:
+            self.tracked_positions = [(r.a, r.b) for r in self.view.sel()]
+            self.patch_changes = {}
+            self.timestamps = []
+            self.loading = True
+            self.cancelled = False
+            self.previewing = False
+            self.panel_shown = False
+            self.panel_generation = 0
+            self.panel_length = 0
+            self.group_path = []
+            self.metadata = {}
+            self.view.set_status('diff_history', 'Loading history...')
+            # Opened at once with just the placeholder, so Esc
+            # cancels the load however long it takes.
+            self.show_panel()
+            threading.Thread(target=self.load_history, daemon=True).start()
+
+    def load_history(self):
+        """
+        Runs off the UI thread. The panel is refreshed as soon 
+        as the newest page of snapshots is ready, the rest are 
+        streamed in as they are built.
+        """
+        filename = self.view.file_name()
+        snapshot_view(self.view, self.existing_contents, self.name())
+        history = engine.get_history(filename)
+        if not history:
+            sublime.set_timeout(self.finish_loading, 0)
+            return
+        if self.cancelled:
+            return
+        self.history = history
+        self.metadata = engine.read_side_file(filename, '.meta') or {}
+        self.sorted_timestamps = engine.history_timestamps(history)
+        if len(self.sorted_timestamps) > HISTORY_GROUP_THRESHOLD:
+            self.loading = False
+            self.view.erase_status('diff_history')
+            sublime.set_timeout(lambda: self.show_group_panel(
+                0, len(self.sorted_timestamps), 0), 0)
+            return
+        next_refresh = HISTORY_PAGE_SIZE
+        for timestamp, patch in engine.iter_history_patches(
+                history,
+                self.existing_contents,
+                self.tracked_positions,
+                self.sorted_timestamps):
+            if self.cancelled:
                 return
+            self.patch_changes[timestamp] = patch
+            self.timestamps.append(timestamp)
+            if len(self.timestamps) >= next_refresh:
+                next_refresh += HISTORY_PAGE_SIZE
+                self.view.set_status('diff_history', 
+                    'Loading history: %d of %d snapshots' % (
+                        len(self.timestamps), len(history)))
+                if len(self.timestamps) == HISTORY_PAGE_SIZE:
+                    sublime.set_timeout(self.show_panel, 0)
+        sublime.set_timeout(self.finish_loading, 0)
+
+    def finish_loading(self):
+        self.loading = False
+        self.view.erase_status('diff_history')
+        if self.cancelled:
+            return
+        if not self.timestamps:
+            global is_browsing_history
+            is_browsing_history = False
+            # close the placeholder panel
+            self.view.window().run_command('hide_overlay')
+            return
+        self.show_panel()
 
-            string_timestamps = [
-                datetime.datetime.fromtimestamp(int(i)).strftime(TS_FORMAT) for i in 
-                sorted([int(i) for i in self.patch_changes.keys()], reverse=True)
-                ]
-
-            self.timestamps = sorted(self.patch_changes.keys(), reverse=True)
-            self.view.window().show_quick_panel(
-                string_timestamps,
-                self.done,
-                on_highlight=self.show_state)
+    def show_group_panel(self, start, end, level):
+        """
+        For long histories, browse by day, then by hour, then 
+        individual snapshots. Only the groups on screen are
+        formatted; snapshots are built when a group is chosen.
+        """
+        boundary = (engine.day_start, engine.hour_start)[level]
+        groups = engine.group_timestamps(self.sorted_timestamps, start, end, boundary)
+        labels = [
+            '%s  (%d snapshots)' % (
+                datetime.datetime.fromtimestamp(
+                    self.sorted_timestamps[group_end - 1]
+                    ).strftime(GROUP_FORMATS[level]),
+                group_end - group_start)
+            for group_start, group_end in groups
+            ]
+        self.group_path.append((start, end, level))
+        # this replaces the placeholder panel, whose callback
+        # must not end browsing
+        self.panel_generation += 1
+
+        def on_done(index):
+            if index == -1:
+                self.group_path.pop()
+                if self.group_path:
+                    self.show_group_panel(*self.group_path.pop())
+                else:
+                    self.done(-1)
+                return
+            group_start, group_end = groups[index]
+            if level == 0 and group_end - group_start > HISTORY_PAGE_SIZE:
+                self.show_group_panel(group_start, group_end, 1)
+                return
+            self.loading = True
+            self.view.set_status('diff_history', 'Loading history...')
+            threading.Thread(
+                target=self.load_group, 
+                args=(group_start, group_end), 
+                daemon=True).start()
+
+        self.view.window().show_quick_panel(labels, on_done)
+
+    def load_group(self, start, end):
+        keys = [str(i) for i in reversed(self.sorted_timestamps[start:end])]
+        missing = set(key for key in keys if key not in self.patch_changes)
+        if missing:
+            oldest = min(missing, key=int)
+            for timestamp, patch in engine.iter_history_patches(
+                    self.history,
+                    self.existing_contents,
+                    self.tracked_positions,
+                    self.sorted_timestamps):
+                if timestamp in missing:
+                    self.patch_changes[timestamp] = patch
+                if timestamp == oldest:
+                    break
+        self.timestamps = keys
+        self.loading = False
+        self.panel_shown = False
+        self.view.erase_status('diff_history')
+        sublime.set_timeout(self.show_panel, 0)
+
+    def show_panel(self):
+        if self.cancelled:
+            return
+        string_timestamps = [
+            snapshot_label(i, self.metadata.get(i)) 
+            for i in self.timestamps[:]
+            ]
+        self.panel_length = len(string_timestamps)
+        if self.loading:
+            string_timestamps.append('Loading older snapshots...')
+        selected_index = -1
+        if self.panel_shown:
+            selected_index = self.highlighted_index
+        self.panel_shown = True
+        self.highlighted_index = 0
+        # Replacing an open panel cancels it; the stale
+        # generation lets done() ignore that callback.
+        self.panel_generation += 1
+        generation = self.panel_generation
+        self.view.window().show_quick_panel(
+            string_timestamps,
+            lambda index: self.done(index, generation),
+            selected_index=selected_index,
+            on_highlight=self.show_state)
 
     def show_state(self, distance_back):
+        if distance_back >= self.panel_length:
+            return
+        self.highlighted_index = distance_back
         patch = self.patch_changes[self.timestamps[distance_back]]    
+        if not self.previewing:
+            # the buffer could still be edited while the history
+            # loaded, so what to restore is taken now
+            self.existing_contents = self.view.substr(sublime.Region(0, self.view.size()))
+            self.previewing = True
         self.view.erase_regions('dmp_add')
         self.view.erase_regions('dmp_del')
 
@@ -131,12 +305,33 @@ class BrowseHistoryCommand(sublime_plugin.TextCommand):
                 [sublime.Region(region[0], region[1])],
                 scope="region.redish")
 
-        self.view.show_at_center(sublime.Region(
-            patch['approx_position'],
-            patch['approx_position']),
-            animate=False)
-
-    def done(self, index):
+        self.view.add_regions('dmp_pos',
+            [sublime.Region(a, b) for a, b in patch['positions']],
+            scope="region.bluish",
+            flags=sublime.DRAW_EMPTY)
+
+        if patch['positions']:
+            self.view.show_at_center(sublime.Region(
+                patch['positions'][0][0],
+                patch['positions'][0][1]),
+                animate=False)
+
+    def done(self, index, generation=None):
+        if generation is not None and generation != self.panel_generation:
+            return
+        if index >= self.panel_length:
+            # "Loading older snapshots" placeholder; keep browsing.
+            sublime.set_timeout(self.show_panel, 0)
+            return
+        if index == -1 and self.group_path:
+            # back out to the enclosing day/hour list
+            self.restore_contents()
+            self.show_group_panel(*self.group_path.pop())
+            return
+        # browsing is over; stop the loader reopening the panel
+        self.cancelled = True
+        if self.loading:
+            self.view.erase_status('diff_history')
         self.view.erase_regions('dmp_add')
         if index > -1: 
             deleted_regions = self.view.get_regions('dmp_del')
@@ -147,136 +342,640 @@ class BrowseHistoryCommand(sublime_plugin.TextCommand):
                     'replacement_text' :''
                     })
         else: # escaped/cancelled
-            self.view.run_command('diff_match_patch_replace', {
-                'start' : 0,
-                'end' :self.view.size(),
-                'replacement_text' : self.existing_contents
-            })
+            self.restore_contents()
         self.view.erase_regions('dmp_del')
         self.view.erase_regions('dmp_pos')
         global is_browsing_history
         is_browsing_history=False
 
-def take_snapshot(filename, contents):
-
-    dmp = dmp_module.diff_match_patch()
-
-    if not os.path.exists(os.path.join(os.path.dirname(filename), '_diff')):
-        os.mkdir(os.path.join(os.path.dirname(filename), '_diff'))
-    
-    history_file = os.path.join(
-        os.path.dirname(filename), 
-        '_diff',
-        os.path.basename(filename) + '.diff')
-    
-    file_history = get_history(filename)
-    if not file_history:
-        file_history = { int(time.time()) : contents }
-        with open( history_file, "w") as f:
-            f.write(json.dumps(file_history))
+    def restore_contents(self):
+        self.view.erase_regions('dmp_add')
+        self.view.erase_regions('dmp_del')
+        self.view.erase_regions('dmp_pos')
+        if not self.previewing:
+            return # nothing was overwritten
+        self.view.run_command('diff_match_patch_replace', {
+            'start' : 0,
+            'end' :self.view.size(),
+            'replacement_text' : self.existing_contents
+        })
+
+class BrowseSelectionHistoryCommand(sublime_plugin.TextCommand):
+    """
+    Browse only the snapshots that changed the selected region,
+    previewing each version of it in place.
+    """
+
+    def run(self, edit):
+        if not self.view.file_name():
+            return
+        global is_browsing_history
+        if is_browsing_history:
+            return
+        is_browsing_history = True
+        region = self.view.sel()[0]
+        if region.empty():
+            region = self.view.line(region)
+        self.region = (region.begin(), region.end())
+        self.region_end = region.end()
+        self.existing_contents = self.view.substr(sublime.Region(0, self.view.size()))
+        self.view.set_status('diff_history', 'Loading selection history...')
+        threading.Thread(target=self.load_history, daemon=True).start()
+
+    def load_history(self):
+        filename = self.view.file_name()
+        snapshot_view(self.view, self.existing_contents, self.name())
+        history = engine.get_history(filename)
+        self.versions = []
+        if history:
+            self.versions = list(engine.iter_region_history(
+                history, 
+                self.existing_contents, 
+                self.region))
+        self.view.erase_status('diff_history')
+        sublime.set_timeout(self.show_panel, 0)
+
+    def show_panel(self):
+        global is_browsing_history
+        if not self.versions:
+            sublime.status_message('No history for this selection')
+            is_browsing_history = False
+            return
+        labels = [
+            [datetime.datetime.fromtimestamp(int(timestamp)).strftime(engine.TS_FORMAT),
+             text.strip().split('\n')[0] if text.strip() else '(empty)']
+            for timestamp, text in self.versions
+            ]
+        self.view.window().show_quick_panel(
+            labels,
+            self.done,
+            on_highlight=self.show_version)
+
+    def show_version(self, index):
+        self.replace_region(self.versions[index][1])
+        self.view.add_regions('dmp_add',
+            [sublime.Region(self.region[0], self.region_end)],
+            scope="region.greenish",
+            flags=sublime.DRAW_EMPTY)
+        self.view.show_at_center(sublime.Region(self.region[0], self.region[0]))
+
+    def replace_region(self, text):
+        self.view.run_command('diff_match_patch_replace', {
+            'start' : self.region[0],
+            'end' : self.region_end,
+            'replacement_text' : text
+            })
+        self.region_end = self.region[0] + len(text)
+
+    def done(self, index):
+        if index == -1:
+            self.replace_region(
+                self.existing_contents[self.region[0]:self.region[1]])
+        self.view.erase_regions('dmp_add')
+        global is_browsing_history
+        is_browsing_history = False
+
+class CompareHistoryCommand(sublime_plugin.TextCommand):
+    """
+    Pick any two snapshots and show everything that changed
+    between them in a scratch view.
+    """
+
+    def run(self, edit):
+        if not self.view.file_name():
+            return
+        self.filename = self.view.file_name()
+        self.view.set_status('diff_history', 'Loading history...')
+        threading.Thread(
+            target=self.load_history, 
+            args=(self.view.substr(sublime.Region(0, self.view.size())),), 
+            daemon=True).start()
+
+    def load_history(self, contents):
+        snapshot_view(self.view, contents, self.name())
+        self.history = engine.get_history(self.filename)
+        self.view.erase_status('diff_history')
+        if not self.history:
+            return
+        self.sorted_timestamps = engine.history_timestamps(self.history)
+        self.metadata = engine.read_side_file(self.filename, '.meta') or {}
+        sublime.status_message('Compare from...')
+        sublime.set_timeout(lambda: self.pick(self.choose_from), 0)
+
+    def pick(self, on_pick):
+        pick_snapshot(
+            self.view.window(), 
+            self.sorted_timestamps, 
+            on_pick, 
+            self.metadata)
+
+    def choose_from(self, index):
+        if index == -1:
+            return
+        self.from_index = index
+        sublime.status_message('Compare to...')
+        self.pick(self.choose_to)
+
+    def choose_to(self, index):
+        if index == -1:
+            return
+        to_index = index
+        from_index = self.from_index
+        if to_index < from_index:
+            from_index, to_index = to_index, from_index
+        self.view.set_status('diff_history', 'Comparing...')
+        threading.Thread(
+            target=self.compare, 
+            args=(from_index, to_index), 
+            daemon=True).start()
+
+    def compare(self, from_index, to_index):
+        diffs = engine.changes_between(
+            self.filename, 
+            self.sorted_timestamps[from_index], 
+            self.sorted_timestamps[to_index],
+            self.history)
+        self.view.erase_status('diff_history')
+        sublime.set_timeout(lambda: show_comparison(
+            self.view.window(),
+            self.view.settings().get('syntax'),
+            self.filename,
+            diffs, 
+            self.sorted_timestamps[from_index], 
+            self.sorted_timestamps[to_index]), 0)
+
+class SearchHistoryCommand(sublime_plugin.TextCommand):
+    """
+    Find the snapshots that introduced or removed a word,
+    using the token index kept next to the history.
+    """
+
+    def run(self, edit):
+        if not self.view.file_name():
+            return
+        self.filename = self.view.file_name()
+        self.contents = self.view.substr(sublime.Region(0, self.view.size()))
+        selected = self.view.substr(self.view.sel()[0])
+        self.view.window().show_input_panel(
+            'Search history for:', 
+            selected if engine.TOKEN_PATTERN.fullmatch(selected) else '',
+            self.search, 
+            None, 
+            None)
+
+    def search(self, term):
+        self.term = term.strip()
+        if not self.term:
+            return
+        self.view.set_status('diff_history', 'Searching history...')
+        threading.Thread(target=self.load_results, daemon=True).start()
+
+    def load_results(self):
+        snapshot_view(self.view, self.contents, self.name())
+        self.history = engine.get_history(self.filename)
+        self.view.erase_status('diff_history')
+        if not self.history:
+            return
+        self.sorted_timestamps = engine.history_timestamps(self.history)
+        token_index = engine.get_token_index(self.filename, self.history)
+        self.results = sorted(
+            [(timestamp, 'introduced') for timestamp in token_index['added'].get(self.term, [])] +
+            [(timestamp, 'removed') for timestamp in token_index['removed'].get(self.term, [])],
+            reverse=True)
+        sublime.set_timeout(self.show_results, 0)
+
+    def show_results(self):
+        if not self.results:
+            sublime.status_message('"%s" not found in history' % self.term)
+            return
+        self.view.window().show_quick_panel(
+            [[datetime.datetime.fromtimestamp(timestamp).strftime(engine.TS_FORMAT),
+              '%s %s' % (self.term, change)]
+             for timestamp, change in self.results],
+            self.done)
+
+    def done(self, index):
+        if index == -1:
+            return
+        threading.Thread(
+            target=self.compare, 
+            args=(self.results[index][0],), 
+            daemon=True).start()
+
+    def compare(self, timestamp):
+        show_snapshot_change(
+            self.view.window(),
+            self.view.settings().get('syntax'),
+            self.filename,
+            self.history,
+            self.sorted_timestamps,
+            timestamp)
+
+class BlameHistoryCommand(sublime_plugin.TextCommand):
+    """
+    Toggle phantoms showing when each block of lines was last
+    changed.
+    """
+
+    def run(self, edit):
+        if not self.view.file_name():
+            return
+        phantom_set = blame_phantoms.pop(self.view.id(), None)
+        if phantom_set:
+            phantom_set.update([])
+            return
+        self.contents = self.view.substr(sublime.Region(0, self.view.size()))
+        self.view.set_status('diff_history', 'Loading blame...')
+        threading.Thread(target=self.load_blame, daemon=True).start()
+
+    def load_blame(self):
+        filename = self.view.file_name()
+        snapshot_view(self.view, self.contents, self.name())
+        history = engine.get_history(filename)
+        self.view.erase_status('diff_history')
+        if history:
+            origins = engine.get_blame(filename, history)
+            sublime.set_timeout(lambda: self.show_blame(origins), 0)
+
+    def show_blame(self, origins):
+        phantoms = []
+        line = 0
+        for timestamp, count in engine.encode_blame(origins):
+            point = self.view.text_point(line, 0)
+            phantoms.append(sublime.Phantom(
+                sublime.Region(point, point),
+                '<span style="color: color(var(--foreground) alpha(0.5))">%s</span>' % (
+                    datetime.datetime.fromtimestamp(timestamp).strftime(engine.TS_FORMAT)),
+                sublime.LAYOUT_BLOCK))
+            line += count
+        phantom_set = sublime.PhantomSet(self.view, 'diff_history_blame')
+        phantom_set.update(phantoms)
+        blame_phantoms[self.view.id()] = phantom_set
+
+class RecentChangesCommand(sublime_plugin.WindowCommand):
+    """
+    List recent snapshots across all project folders from their
+    timelines; a history file is only read once one is chosen.
+    """
+
+    def run(self):
+        self.changes = []
+        for folder in self.window.folders():
+            for change in engine.read_timeline(folder, RECENT_CHANGES_LIMIT):
+                change['path'] = os.path.join(folder, change['file'])
+                self.changes.append(change)
+        if not self.changes:
+            sublime.status_message('No recent changes')
+            return
+        self.changes.sort(key=lambda change: change['timestamp'], reverse=True)
+        del self.changes[RECENT_CHANGES_LIMIT:]
+        self.window.show_quick_panel(
+            [[change['file'], 
+              '%s  +%d -%d' % (
+                  datetime.datetime.fromtimestamp(change['timestamp']).strftime(engine.TS_FORMAT),
+                  change['added'],
+                  change['removed'])]
+             for change in self.changes],
+            self.done)
+
+    def done(self, index):
+        if index == -1:
+            return
+        change = self.changes[index]
+        self.window.open_file(change['path'])
+        threading.Thread(
+            target=self.compare, 
+            args=(change['path'], change['timestamp']), 
+            daemon=True).start()
+
+    def compare(self, filename, timestamp):
+        history = engine.get_history(filename)
+        if not history or str(timestamp) not in history:
+            return
+        show_snapshot_change(
+            self.window,
+            None,
+            filename,
+            history,
+            engine.history_timestamps(history),
+            timestamp)
+
+def snapshot_label(timestamp, metadata=None):
+    label = datetime.datetime.fromtimestamp(int(timestamp)).strftime(engine.TS_FORMAT)
+    if metadata:
+        label += '   +%d -%d' % (metadata['inserted'], metadata['deleted'])
+    return label
+
+def pick_snapshot(window, timestamps, on_pick, metadata=None):
+    """
+    Pick one of the sorted timestamps from a quick panel, newest
+    first, calling on_pick with its index or -1. Long histories
+    are picked by day, then hour, then snapshot, formatting only
+    the groups on screen; escaping backs out a level.
+    """
+    metadata = metadata or {}
+
+    def show(labels, on_done):
+        sublime.set_timeout(lambda: window.show_quick_panel(labels, on_done), 0)
+
+    def show_snapshots(start, end, back):
+        def on_done(index):
+            if index == -1:
+                back()
+            else:
+                on_pick(end - 1 - index)
+        show([snapshot_label(timestamps[i], metadata.get(str(timestamps[i])))
+              for i in range(end - 1, start - 1, -1)],
+             on_done)
+
+    def show_groups(start, end, level, back):
+        boundary = (engine.day_start, engine.hour_start)[level]
+        groups = engine.group_timestamps(timestamps, start, end, boundary)
+
+        def on_done(index):
+            if index == -1:
+                back()
+                return
+            group_start, group_end = groups[index]
+            again = lambda: show_groups(start, end, level, back)
+            if level == 0 and group_end - group_start > HISTORY_PAGE_SIZE:
+                show_groups(group_start, group_end, 1, again)
+            else:
+                show_snapshots(group_start, group_end, again)
+
+        show(['%s  (%d snapshots)' % (
+                  datetime.datetime.fromtimestamp(
+                      timestamps[group_end - 1]
+                      ).strftime(GROUP_FORMATS[level]),
+                  group_end - group_start)
+              for group_start, group_end in groups],
+             on_done)
+
+    if len(timestamps) > HISTORY_GROUP_THRESHOLD:
+        show_groups(0, len(timestamps), 0, lambda: on_pick(-1))
     else:
-        latest_history = apply_patches(file_history)
-        if contents != latest_history:
-            file_history[int(time.time())] = dmp.patch_toText(
-                dmp.patch_make(
-                    latest_history, 
-                    contents)
-                )
-            os.remove(history_file) # might prevent duplicate files on cloud storage ?
-            with open(history_file, "w") as f:
-                f.write(json.dumps(file_history))
-
-
-def build_history_patches_with_deletions(filename, tracked_position):
-
-    dmp = dmp_module.diff_match_patch()
-    history = get_history(filename)
-    timestamps = sorted(history.keys())
-    original = history[timestamps[0]]
-    fully_patched_original = original
-    added_ranges = []
-    deleted_ranges = []
-    next_patch = None
-
-    patch_changes = {}
-
-    for index in range(0, len(timestamps)):
-        timestamp = timestamps[index]
-        next_patch = history[timestamp]
-        if index == 0: # first entry
-            patch_changes[timestamp] = {
-                'added_ranges': [(0, len(next_patch))],
-                'deleted_ranges' : [],
-                'state': next_patch,
-                'display' : next_patch,
-                'approx_position': tracked_position
-            }
+        show_snapshots(0, len(timestamps), lambda: on_pick(-1))
+
+class ReconcileHistoriesCommand(sublime_plugin.WindowCommand):
+    """
+    Find histories orphaned by moves outside the editor and
+    move them to their file.
+    """
+
+    def run(self):
+        threading.Thread(target=self.reconcile, daemon=True).start()
+
+    def reconcile(self):
+        moves = engine.reconcile_histories(self.window.folders())
+        sublime.status_message('Re-linked %d histories' % len(moves))
+
+def reconcile_folders(folders):
+    """
+    Re-link histories of files moved while the editor was 
+    closed, in the background as folders are opened.
+    """
+    moves = engine.reconcile_histories(sorted(set(folders)))
+    if moves:
+        sublime.status_message('Re-linked %d histories' % len(moves))
+
+class ImportGitHistoryCommand(sublime_plugin.WindowCommand):
+    """
+    Seed histories from git log, for the active file or for 
+    every tracked file in the project folders.
+    """
+
+    def run(self, scope='file'):
+        if scope == 'file':
+            view = self.window.active_view()
+            if not view or not view.file_name():
+                return
+            filenames = [view.file_name()]
+        else:
+            filenames = []
+            for folder in self.window.folders():
+                filenames.extend(engine.git_tracked_files(folder))
+        threading.Thread(
+            target=self.import_files, 
+            args=(filenames,), 
+            daemon=True).start()
+
+    def import_files(self, filenames):
+        imported = 0
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=GIT_IMPORT_WORKERS) as executor:
+            for count, records in enumerate(
+                    executor.map(engine.import_git_history, filenames), 1):
+                imported += records
+                sublime.status_message('Importing git history: %d of %d files' % (
+                    count, len(filenames)))
+        sublime.status_message('Imported %d snapshots from git' % imported)
+
+class DiffTimeoutsCommand(sublime_plugin.WindowCommand):
+    """
+    Show how often diffs this session ran out of time and
+    settled for coarser patches.
+    """
+
+    def run(self):
+        report = engine.diff_timeout_report()
+        if not report:
+            sublime.status_message('No diffs yet')
+            return
+        self.window.show_quick_panel(report, lambda index: None)
+
+class ExportHistoryCommand(sublime_plugin.TextCommand):
+    """
+    Export the history as a unified diff series, the full text
+    at one snapshot, or a git repository.
+    """
+
+    def run(self, edit, format='patches'):
+        if not self.view.file_name():
+            return
+        self.filename = self.view.file_name()
+        self.format = format
+        if not os.path.exists(engine.side_file(self.filename, '.diff')):
+            return
+        default_path = os.path.join(
+            os.path.dirname(self.filename), 
+            '_diff', 
+            'export',
+            os.path.basename(self.filename) + EXPORT_EXTENSIONS[format])
+        if format == 'states':
+            threading.Thread(
+                target=self.pick_state, 
+                args=(default_path,), 
+                daemon=True).start()
+        else:
+            self.ask_path(default_path)
+
+    def pick_state(self, default_path):
+        """
+        Offer the snapshots to export, listing them by streaming 
+        the history rather than loading it.
+        """
+        self.view.set_status('diff_history', 'Loading history...')
+        try:
+            timestamps = sorted(int(timestamp) 
+                for timestamp, record in engine.iter_history_records(self.filename))
+        except (OSError, ValueError) as e:
+            sublime.status_message('Could not read history: %s' % e)
+            return
+        finally:
+            self.view.erase_status('diff_history')
+        sublime.set_timeout(lambda: pick_snapshot(
+            self.view.window(), 
+            timestamps, 
+            lambda index: index > -1 and self.ask_path(
+                default_path, [timestamps[index]])), 0)
+
+    def ask_path(self, default_path, timestamps=None):
+        self.view.window().show_input_panel(
+            'Export history to:', 
+            default_path, 
+            lambda path: threading.Thread(
+                target=self.export, 
+                args=(path, timestamps), 
+                daemon=True).start(), 
+            None, 
+            None)
+
+    def export(self, path, timestamps):
+        self.view.set_status('diff_history', 'Exporting history...')
+        try:
+            if self.format == 'patches':
+                directory = os.path.dirname(path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory)
+                with open(path, "w", encoding="utf-8") as out:
+                    count = engine.export_unified_diffs(self.filename, out)
+            elif self.format == 'states':
+                count = engine.export_states(self.filename, timestamps, path)
+            else:
+                count = engine.export_git(self.filename, path)
+        except Exception as e:
+            sublime.status_message('Export failed: %s' % e)
+            return
+        finally:
+            self.view.erase_status('diff_history')
+        sublime.status_message('Exported %d snapshots to %s' % (count, path))
+
+def show_snapshot_change(window, syntax, filename, history, timestamps, timestamp):
+    """
+    Show what one snapshot changed against the one before it.
+    """
+    to_index = bisect.bisect_left(timestamps, timestamp)
+    if to_index == 0:
+        diffs = [(1, history[str(timestamp)])]
+        from_timestamp = timestamp
+    else:
+        diffs = engine.changes_between(
+            filename, 
+            timestamps[to_index - 1], 
+            timestamp,
+            history)
+        from_timestamp = timestamps[to_index - 1]
+    sublime.set_timeout(lambda: show_comparison(
+        window, 
+        syntax,
+        filename, 
+        diffs, 
+        from_timestamp, 
+        timestamp), 0)
+
+def show_comparison(window, syntax, filename, diffs, from_timestamp, to_timestamp):
+    display, added_ranges, deleted_ranges = engine.diffs_to_display(diffs)
+    view = window.new_file()
+    view.set_scratch(True)
+    view.set_name('%s: %s to %s' % (
+        os.path.basename(filename),
+        datetime.datetime.fromtimestamp(from_timestamp).strftime(engine.TS_FORMAT),
+        datetime.datetime.fromtimestamp(to_timestamp).strftime(engine.TS_FORMAT)))
+    if syntax:
+        view.assign_syntax(syntax)
+    view.run_command('diff_match_patch_replace', {
+        'start' : 0,
+        'end' : 0,
+        'replacement_text' : display
+        })
+    view.add_regions('dmp_add', 
+        [sublime.Region(a, b) for a, b in added_ranges],
+        scope="region.greenish")
+    view.add_regions('dmp_del', 
+        [sublime.Region(a, b) for a, b in deleted_ranges],
+        scope="region.redish")
+    view.set_read_only(True)
+
+def snapshot_view(view, contents, trigger):
+    engine.record(
+        view.file_name(), 
+        contents, 
+        project_folder(view), 
+        { 'event': trigger, 'view': view.id() })
+
+def check_disk(view, trigger):
+    """
+    Snapshot the file as it is on disk if it was changed outside
+    the editor, so external changes are recorded on their own.
+    """
+    filename = view.file_name()
+    if not filename or filename.endswith('.diff'):
+        return
+    engine.record_disk_changes(
+        filename, 
+        project_folder(view), 
+        { 'event': trigger, 'view': view.id(), 'source': 'disk' })
+
+def follow_moves():
+    """
+    Relocate the histories of files renamed with rename_path 
+    once the rename has happened, finding the new path by
+    identity among the window's views and the old directory.
+    Only one of these is scheduled at a time.
+    """
+    global pending_moves, following_moves
+    with moves_lock:
+        checking, pending_moves = pending_moves, []
+    moves = []
+    waiting = []
+    unresolved = []
+    for old_name, identity, window, attempts in checking:
+        if os.path.exists(old_name):
+            if attempts < RENAME_CHECK_ATTEMPTS:
+                waiting.append((old_name, identity, window, attempts + 1))
             continue
-
-        patch_group = dmp.patch_fromText(next_patch)
-        fully_patched_original = dmp.patch_apply(
-            patch_group,
-            fully_patched_original)[0]
-        patch_changes[timestamp] = {
-            'added_ranges' : [],
-            'deleted_ranges' : []
-        }
-        display_state_at_timestamp = fully_patched_original
-        for patch in patch_group:
-            start_offset = 0
-            # offset = 0
-            # offset_pos = 0
-            for diff_type, diff_text in patch.diffs:
-                if diff_type == 0:
-                    start_offset += len(diff_text)
-                start_pos = start_offset+patch.start2
-                end_pos = start_pos+len(diff_text)
-                if diff_type == -1:
-                    display_state_at_timestamp = ''.join([
-                        display_state_at_timestamp[:start_pos],
-                        diff_text,
-                        display_state_at_timestamp[start_pos:]
-                        ])
-                    patch_changes[timestamp]['deleted_ranges'].append((start_pos, end_pos))
-                    # offset = len(diff_text)
-                    # offset_pos = start_pos
-                if diff_type == 1:
-                    # if offset > 0 and offset_pos < start_pos:
-                    #     start_pos += offset
-                    patch_changes[timestamp]['added_ranges'].append((start_pos, end_pos))
-
-        patch_changes[timestamp]['display'] = display_state_at_timestamp
-
-    for index in range(len(timestamps)-1, 0, -1):
-        patch = patch_changes[timestamps[index]]
-        for region in patch['added_ranges']:
-            if region[0] < tracked_position:
-                tracked_position += (region[1] - region[0])
-        for region in patch['deleted_ranges']:
-            if region[1] < tracked_position:
-                tracked_position -= (region[1] - region[0])
-        patch['approx_position'] = tracked_position
-
-    return patch_changes
-
-def apply_patches(history):
-    dmp = dmp_module.diff_match_patch()
-    timestamps = sorted(history.keys())
-    original = history[timestamps[0]]
-    for index in range(1,len(timestamps)):
-        next_patch = history[timestamps[index]]
-        original = dmp.patch_apply(dmp.patch_fromText(next_patch), original)[0]
-    return original
-
-def get_history(filename):
-    history_file = os.path.join(
-        os.path.dirname(filename), 
-        '_diff', 
-        os.path.basename(filename) + '.diff')
-    if os.path.exists(history_file):
-        with open(history_file, "r") as f:
-            file_history = f.read()
-        return json.loads(file_history)
+        candidates = [v.file_name() for v in window.views() if v.file_name()]
+        directory = os.path.dirname(old_name)
+        try:
+            candidates += [os.path.join(directory, name) for name in os.listdir(directory)]
+        except OSError: # the directory went too
+            pass
+        for candidate in candidates:
+            if identity and engine.file_identity(candidate) == identity:
+                moves.append((old_name, candidate))
+                break
+        else:
+            unresolved.append(window)
+    engine.relocate_histories(moves)
+    for window in unresolved:
+        engine.reconcile_histories(window.folders())
+    with moves_lock:
+        pending_moves.extend(waiting)
+        following_moves = bool(pending_moves)
+    if following_moves:
+        sublime.set_timeout_async(follow_moves, RENAME_CHECK_DELAY)
+
+def project_folder(view):
+    """
+    The window folder containing the view's file, if any.
+    """
+    window = view.window()
+    filename = view.file_name()
+    if not window or not filename:
+        return None
+    for folder in window.folders():
+        if filename.startswith(os.path.join(folder, '')):
+            return folder
 
 class DiffMatchPatchReplace(sublime_plugin.TextCommand):
 
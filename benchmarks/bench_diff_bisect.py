@@ -0,0 +1,161 @@
+"""
+Benchmark diff_bisect against the original character-at-a-time
+implementation, checking that both produce identical diffs.
+
+    python benchmarks/bench_diff_bisect.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diff_match_patch import diff_match_patch
+
+
+class reference_diff_match_patch(diff_match_patch):
+
+  def diff_bisect(self, text1, text2, deadline):
+    # The unoptimized implementation, as shipped upstream.
+
+    # Cache the text lengths to prevent multiple calls.
+    text1_length = len(text1)
+    text2_length = len(text2)
+    max_d = (text1_length + text2_length + 1) // 2
+    v_offset = max_d
+    v_length = 2 * max_d
+    v1 = [-1] * v_length
+    v1[v_offset + 1] = 0
+    v2 = v1[:]
+    delta = text1_length - text2_length
+    # If the total number of characters is odd, then the front path will
+    # collide with the reverse path.
+    front = (delta % 2 != 0)
+    # Offsets for start and end of k loop.
+    # Prevents mapping of space beyond the grid.
+    k1start = 0
+    k1end = 0
+    k2start = 0
+    k2end = 0
+    for d in range(max_d):
+      # Bail out if deadline is reached.
+      if time.time() > deadline:
+        break
+
+      # Walk the front path one step.
+      for k1 in range(-d + k1start, d + 1 - k1end, 2):
+        k1_offset = v_offset + k1
+        if k1 == -d or (k1 != d and
+            v1[k1_offset - 1] < v1[k1_offset + 1]):
+          x1 = v1[k1_offset + 1]
+        else:
+          x1 = v1[k1_offset - 1] + 1
+        y1 = x1 - k1
+        while (x1 < text1_length and y1 < text2_length and
+               text1[x1] == text2[y1]):
+          x1 += 1
+          y1 += 1
+        v1[k1_offset] = x1
+        if x1 > text1_length:
+          # Ran off the right of the graph.
+          k1end += 2
+        elif y1 > text2_length:
+          # Ran off the bottom of the graph.
+          k1start += 2
+        elif front:
+          k2_offset = v_offset + delta - k1
+          if k2_offset >= 0 and k2_offset < v_length and v2[k2_offset] != -1:
+            # Mirror x2 onto top-left coordinate system.
+            x2 = text1_length - v2[k2_offset]
+            if x1 >= x2:
+              # Overlap detected.
+              return self.diff_bisectSplit(text1, text2, x1, y1, deadline)
+
+      # Walk the reverse path one step.
+      for k2 in range(-d + k2start, d + 1 - k2end, 2):
+        k2_offset = v_offset + k2
+        if k2 == -d or (k2 != d and
+            v2[k2_offset - 1] < v2[k2_offset + 1]):
+          x2 = v2[k2_offset + 1]
+        else:
+          x2 = v2[k2_offset - 1] + 1
+        y2 = x2 - k2
+        while (x2 < text1_length and y2 < text2_length and
+               text1[-x2 - 1] == text2[-y2 - 1]):
+          x2 += 1
+          y2 += 1
+        v2[k2_offset] = x2
+        if x2 > text1_length:
+          # Ran off the left of the graph.
+          k2end += 2
+        elif y2 > text2_length:
+          # Ran off the top of the graph.
+          k2start += 2
+        elif not front:
+          k1_offset = v_offset + delta - k2
+          if k1_offset >= 0 and k1_offset < v_length and v1[k1_offset] != -1:
+            x1 = v1[k1_offset]
+            y1 = v_offset + x1 - k1_offset
+            # Mirror x2 onto top-left coordinate system.
+            x2 = text1_length - x2
+            if x1 >= x2:
+              # Overlap detected.
+              return self.diff_bisectSplit(text1, text2, x1, y1, deadline)
+
+    # Diff took too long and hit the deadline or
+    # number of diffs equals number of characters, no commonality at all.
+    return [(self.DIFF_DELETE, text1), (self.DIFF_INSERT, text2)]
+
+def edited(text, edits, rng):
+  """
+  text with edits random insertions, deletions and replacements.
+  """
+  text = list(text)
+  for _ in range(edits):
+    position = rng.randrange(len(text) + 1)
+    length = rng.randint(1, 20)
+    replacement = list(''.join(rng.choice('abcdefgh \n') for _ in range(rng.randint(0, 20))))
+    text[position:position + length] = replacement
+  return ''.join(text)
+
+def source_text(lines, rng):
+  words = ['def', 'return', 'self', 'value', 'index', 'for', 'in', 'if', 'else', '=', '+', '(', ')']
+  return ''.join(
+    '    ' * rng.randint(0, 3) + ' '.join(rng.choice(words) for _ in range(rng.randint(2, 10))) + '\n'
+    for _ in range(lines))
+
+CASES = [
+  # name, lines, edits
+  ('small file, few edits', 200, 3),
+  ('large file, few edits', 5000, 5),
+  ('large file, many edits', 5000, 60),
+  ('huge file, medium edits', 20000, 20),
+]
+
+def measure(dmp, text1, text2, repeat):
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    diffs = dmp.diff_bisect(text1, text2, sys.maxsize)
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return diffs, best
+
+def main():
+  rng = random.Random(0)
+  reference = reference_diff_match_patch()
+  optimized = diff_match_patch()
+  print('%-28s %10s %10s %8s' % ('case', 'original', 'optimized', 'speedup'))
+  for name, lines, edits in CASES:
+    text1 = source_text(lines, rng)
+    text2 = edited(text1, edits, rng)
+    expected, before = measure(reference, text1, text2, 3)
+    actual, after = measure(optimized, text1, text2, 3)
+    if actual != expected:
+      sys.exit('%s: optimized diff differs from the original' % name)
+    print('%-28s %9.3fs %9.3fs %7.1fx' % (name, before, after, before / after))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,191 @@
+"""
+Micro-benchmarks for the diff_match_patch functions the history spends
+its time in, on synthetic corpora, checked against stored baselines.
+
+    python benchmarks/bench_dmp.py             # compare with the baseline
+    python benchmarks/bench_dmp.py --save      # record a new baseline
+
+Each function is timed as the best of --repeat samples, looped so that
+a sample takes at least MIN_SAMPLE seconds, then run once more under
+tracemalloc for its peak allocation. A time or peak more than
+--threshold above the baseline is flagged, and the exit status is 1.
+Times are compared relative to a fixed reference workload timed before
+each corpus, which evens out a machine that is busier than it was, but they
+only compare on the machine the baseline was saved on.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diff_match_patch import diff_match_patch
+from bench_diff_bisect import edited, source_text
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_dmp.json')
+# Characters of each text diff_bisect is run on, from the first
+# difference; it has no line mode or trimming of its own, so whole files
+# are too slow for some corpora.
+BISECT_EXCERPT = 1000
+# Shortest time to loop a function for, so fast ones time reliably.
+MIN_SAMPLE = 0.05
+
+UNICODE_WORDS = [
+  'café', 'naïve', 'straße', 'Ελληνικά', 'русский', '日本語', '中文',
+  '한국어', 'עברית', 'العربية', '😀', '🚀', '𝔘𝔫𝔦𝔠𝔬𝔡𝔢', '=', '(', ')']
+
+def small_edits(rng):
+  text1 = source_text(20000, rng)
+  return text1, edited(text1, 10, rng)
+
+def big_paste(rng):
+  text1 = source_text(5000, rng)
+  position = text1.index('\n', len(text1) // 2) + 1
+  return text1, text1[:position] + source_text(5000, rng) + text1[position:]
+
+def reformat(rng):
+  # Every line changes, so diff_main rediffs the whole file by character.
+  text1 = source_text(120, rng)
+  return text1, text1.replace('    ', '\t').replace(' = ', '=').replace('(', '( ')
+
+def unicode_text(rng):
+  text1 = ''.join(
+    ' '.join(rng.choice(UNICODE_WORDS) for _ in range(rng.randint(2, 10))) + '\n'
+    for _ in range(5000))
+  text2 = list(text1)
+  for _ in range(40):
+    position = rng.randrange(len(text2) + 1)
+    text2[position:position + rng.randint(1, 20)] = rng.choice(UNICODE_WORDS)
+  return text1, ''.join(text2)
+
+CORPORA = [
+  ('small edits', small_edits),
+  ('big paste', big_paste),
+  ('reformat', reformat),
+  ('unicode', unicode_text),
+]
+
+def functions(dmp, text1, text2):
+  """
+  (name, call) for each benchmarked function, with its inputs prepared.
+  """
+  patches = dmp.patch_make(text1, text2)
+  patch_text = dmp.patch_toText(patches)
+  start = dmp.diff_commonPrefix(text1, text2)
+  excerpt1 = text1[start:start + BISECT_EXCERPT]
+  excerpt2 = text2[start:start + BISECT_EXCERPT]
+  return [
+    ('diff_main', lambda: dmp.diff_main(text1, text2)),
+    ('diff_bisect', lambda: dmp.diff_bisect(excerpt1, excerpt2, sys.maxsize)),
+    ('patch_make', lambda: dmp.patch_make(text1, text2)),
+    ('patch_toText', lambda: dmp.patch_toText(patches)),
+    ('patch_fromText', lambda: dmp.patch_fromText(patch_text)),
+    ('patch_apply', lambda: dmp.patch_apply(patches, text1)),
+  ]
+
+def measure(call, repeat):
+  """
+  Best time of a call over repeat samples in seconds, and the peak bytes
+  allocated by one.
+  """
+  start = time.perf_counter()
+  call()
+  number = max(1, int(MIN_SAMPLE / (time.perf_counter() - start)))
+  best = None
+  # As timeit does, keep collections out of the samples.
+  gc.disable()
+  try:
+    for _ in range(repeat):
+      start = time.perf_counter()
+      for _ in range(number):
+        call()
+      elapsed = (time.perf_counter() - start) / number
+      best = elapsed if best is None else min(best, elapsed)
+  finally:
+    gc.enable()
+  tracemalloc.start()
+  call()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return best, peak
+
+def reference_workload():
+  rng = random.Random(0)
+  words = ['%x' % rng.getrandbits(32) for _ in range(20000)]
+  counts = {}
+  for word in sorted(words):
+    counts[word[:3]] = counts.get(word[:3], 0) + 1
+  return ''.join(words).find('zz')
+
+def change(value, baseline):
+  return (value - baseline) / baseline if baseline else 0.0
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__,
+    formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--save', action='store_true',
+    help='write the results as the new baseline')
+  parser.add_argument('--baseline', default=BASELINE)
+  parser.add_argument('--repeat', type=int, default=5)
+  parser.add_argument('--threshold', type=float, default=0.25,
+    help='fraction above the baseline that counts as a regression')
+  args = parser.parse_args(argv)
+
+  baseline = {}
+  if not args.save and os.path.exists(args.baseline):
+    with open(args.baseline, encoding='utf-8') as f:
+      baseline = json.load(f)
+
+  dmp = diff_match_patch()
+  # No deadline, so every run does the same work.
+  dmp.Diff_Timeout = 0
+  results = { 'functions': {} }
+  references = []
+  regressions = 0
+  print('%-12s %-15s %10s %8s %10s %8s' % (
+    'corpus', 'function', 'ms', 'change', 'peak KB', 'change'))
+  for corpus, make in CORPORA:
+    text1, text2 = make(random.Random(0))
+    references.append(measure(reference_workload, args.repeat)[0])
+    # How much slower than at the baseline the machine runs now.
+    scale = references[-1] / baseline['reference'] if baseline else 1.0
+    for name, call in functions(dmp, text1, text2):
+      seconds, peak = measure(call, args.repeat)
+      key = '%s/%s' % (corpus, name)
+      results['functions'][key] = { 'seconds': seconds, 'peak_bytes': peak }
+      before = baseline.get('functions', {}).get(key)
+      if before:
+        time_change = change(seconds / scale, before['seconds'])
+        peak_change = change(peak, before['peak_bytes'])
+        regressed = time_change > args.threshold or peak_change > args.threshold
+        regressions += regressed
+        print('%-12s %-15s %10.2f %+7.0f%% %10.0f %+7.0f%%%s' % (
+          corpus, name, seconds * 1000, time_change * 100,
+          peak / 1024, peak_change * 100, '  REGRESSION' if regressed else ''))
+      else:
+        print('%-12s %-15s %10.2f %8s %10.0f %8s' % (
+          corpus, name, seconds * 1000, '', peak / 1024, ''))
+
+  results['reference'] = min(references)
+  if args.save:
+    with open(args.baseline, 'w', encoding='utf-8') as f:
+      json.dump(results, f, indent=1, sort_keys=True)
+    print('saved %d results to %s' % (len(results['functions']), args.baseline))
+  elif not baseline:
+    print('no baseline at %s; run with --save to record one' % args.baseline)
+  else:
+    print('reference workload %+.0f%% to %+.0f%% against the baseline' % (
+      change(min(references), baseline['reference']) * 100,
+      change(max(references), baseline['reference']) * 100))
+  if regressions:
+    print('%d regressions over %.0f%%' % (regressions, args.threshold * 100))
+  return 1 if regressions else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
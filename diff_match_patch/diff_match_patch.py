@@ -25,11 +25,22 @@ Applies the patch onto another text, allowing for errors.
 
 __author__ = 'fraser@google.com (Neil Fraser)'
 
+import array
 import re
 import sys
 import time
 import urllib.parse
 
+# Characters left as they are in patch text, besides letters and digits.
+PATCH_SAFE = "!~*'();/?:@&=+$,# "
+# str.translate table %xx-escaping the other ASCII characters, exactly as
+# urllib.parse.quote would.  Indexed by code point; anything past the end
+# is left for NON_ASCII.
+PATCH_ESCAPES = [urllib.parse.quote(chr(code), PATCH_SAFE)
+                 for code in range(128)]
+NON_ASCII = re.compile("[^\x00-\x7f]+")
+PATCH_HEADER = re.compile(r"^@@ -(\d+),?(\d*) \+(\d+),?(\d*) @@$")
+
 
 class diff_match_patch:
   """Class containing the diff, match and patch methods.
@@ -44,8 +55,23 @@ class diff_match_patch:
 
     # Number of seconds to map a diff before giving up (0 for infinity).
     self.Diff_Timeout = 1.0
+    # Set when the last diff ran out of time and settled for a coarser,
+    # though still correct, result.
+    self.Diff_TimedOut = False
     # Cost of an empty edit operation in terms of edit characters.
     self.Diff_EditCost = 4
+    # How many bisect iterations to run between checks of the deadline.
+    self.Diff_DeadlineInterval = 16
+    # Algorithm for line-level diffs: 'myers' or 'histogram'.  Histogram
+    # anchors on rare lines, so repeated lines like braces and blank lines
+    # don't pull the diff out of shape.
+    self.Diff_LineAlgorithm = 'myers'
+    # Lines occurring more often than this are never used as anchors.
+    self.Diff_HistogramMaxChain = 64
+    # Texts with at least this many lines between them are line-diffed as
+    # arrays of integer line ids instead of strings of one character per
+    # line.  Leaner, and with no limit on distinct lines.  0 to always.
+    self.Diff_LineIdsThreshold = 100000
     # At what point is no match declared (0.0 = perfection, 1.0 = very loose).
     self.Match_Threshold = 0.5
     # How far to search for a match (0 = exact location, 1000+ = broad match).
@@ -65,6 +91,10 @@ class diff_match_patch:
     # However to avoid long patches in certain pathological cases, use 32.
     # Multiple short patches (using native ints) are much faster than long ones.
     self.Match_MaxBits = 32
+    # Apply each patch whole, locating it with bitap on bitmasks as wide as
+    # the pattern, instead of splitting it into Match_MaxBits pieces.  Fewer,
+    # longer matches.  Match_MaxBits still limits the context patch_make adds.
+    self.Match_Unbounded = False
 
   #  DIFF FUNCTIONS
 
@@ -93,6 +123,7 @@ class diff_match_patch:
     """
     # Set a deadline by which time the diff must be complete.
     if deadline == None:
+      self.Diff_TimedOut = False
       # Unlike in most languages, Python counts time in seconds.
       if self.Diff_Timeout <= 0:
         deadline = sys.maxsize
@@ -178,6 +209,11 @@ class diff_match_patch:
       # After the previous speedup, the character can't be an equality.
       return [(self.DIFF_DELETE, text1), (self.DIFF_INSERT, text2)]
 
+    if (checklines and self.Diff_LineAlgorithm != 'myers' and
+        len(text1) > 100 and len(text2) > 100):
+      # The line algorithm picks its own anchors; skip the half match.
+      return self.diff_lineMode(text1, text2, deadline)
+
     # Check to see if the problem can be split in two.
     hm = self.diff_halfMatch(text1, text2)
     if hm:
@@ -209,12 +245,21 @@ class diff_match_patch:
     """
 
     # Scan the text on a line-by-line basis first.
-    (text1, text2, linearray) = self.diff_linesToChars(text1, text2)
+    if (text1.count('\n') + text2.count('\n') >=
+        self.Diff_LineIdsThreshold):
+      (ids1, ids2, starts1, starts2) = self.diff_linesToInts(text1, text2)
+      runs = self.diff_lineIds(ids1, ids2, deadline)
+      diffs = self.diff_runsToLines(runs, text1, text2, starts1, starts2)
+    else:
+      (text1, text2, linearray) = self.diff_linesToChars(text1, text2)
 
-    diffs = self.diff_main(text1, text2, False, deadline)
+      if self.Diff_LineAlgorithm == 'histogram':
+        diffs = self.diff_histogram(text1, text2, deadline)
+      else:
+        diffs = self.diff_main(text1, text2, False, deadline)
 
-    # Convert the diff back to original text.
-    self.diff_charsToLines(diffs, linearray)
+      # Convert the diff back to original text.
+      self.diff_charsToLines(diffs, linearray)
     # Eliminate freak matches (e.g. blank lines)
     self.diff_cleanupSemantic(diffs)
 
@@ -251,6 +296,92 @@ class diff_match_patch:
 
     return diffs
 
+  def diff_histogram(self, text1, text2, deadline):
+    """Diff two strings by anchoring on their least frequent common
+      characters, in the manner of git's histogram diff.  Meant for the
+      encoded lines from diff_linesToChars.  Regions with no anchor fall
+      back to diff_main.
+
+    Args:
+      text1: Old string to be diffed.
+      text2: New string to be diffed.
+      deadline: Time when the diff should be complete by.
+
+    Returns:
+      Array of changes.
+    """
+    diffs = []
+    # Regions are worked left to right off a stack, rather than by
+    # recursion, since files can have many anchors in a row.
+    stack = [(text1, text2)]
+    while stack:
+      region = stack.pop()
+      if len(region) == 1:
+        diffs.append((self.DIFF_EQUAL, region[0]))
+        continue
+      (region1, region2) = region
+      if not region1 or not region2 or time.time() > deadline:
+        diffs += self.diff_main(region1, region2, False, deadline)
+        continue
+      anchor = self.diff_histogramAnchor(region1, region2)
+      if anchor is None:
+        diffs += self.diff_main(region1, region2, False, deadline)
+        continue
+      (start1, start2, length) = anchor
+      stack.append((region1[start1 + length:], region2[start2 + length:]))
+      stack.append((region1[start1:start1 + length],))
+      stack.append((region1[:start1], region2[:start2]))
+    self.diff_cleanupMerge(diffs)
+    return diffs
+
+  def diff_histogramAnchor(self, text1, text2):
+    """Find the common run of characters containing the character with the
+      fewest occurrences in text1, preferring longer runs on ties.
+
+    Args:
+      text1: Old string.
+      text2: New string.
+
+    Returns:
+      Tuple of (start in text1, start in text2, length), or None if every
+      common character occurs more than Diff_HistogramMaxChain times.
+    """
+    occurrences = {}
+    for (index, char) in enumerate(text1):
+      occurrences.setdefault(char, []).append(index)
+    text1_length = len(text1)
+    text2_length = len(text2)
+    best = None
+    best_count = self.Diff_HistogramMaxChain
+    index2 = 0
+    while index2 < text2_length:
+      positions = occurrences.get(text2[index2])
+      next_index2 = index2 + 1
+      if positions is not None and len(positions) <= best_count:
+        for index1 in positions:
+          start1 = index1
+          start2 = index2
+          count = len(positions)
+          while (start1 > 0 and start2 > 0 and
+                 text1[start1 - 1] == text2[start2 - 1]):
+            start1 -= 1
+            start2 -= 1
+            count = min(count, len(occurrences[text1[start1]]))
+          end1 = index1 + 1
+          end2 = index2 + 1
+          while (end1 < text1_length and end2 < text2_length and
+                 text1[end1] == text2[end2]):
+            count = min(count, len(occurrences[text1[end1]]))
+            end1 += 1
+            end2 += 1
+          if (best is None or count < best_count or
+              (count == best_count and end1 - start1 > best[2])):
+            best = (start1, start2, end1 - start1)
+            best_count = count
+          next_index2 = max(next_index2, end2)
+      index2 = next_index2
+    return best
+
   def diff_bisect(self, text1, text2, deadline):
     """Find the 'middle snake' of a diff, split the problem in two
       and return the recursively constructed diff.
@@ -271,7 +402,7 @@ class diff_match_patch:
     max_d = (text1_length + text2_length + 1) // 2
     v_offset = max_d
     v_length = 2 * max_d
-    v1 = [-1] * v_length
+    v1 = array.array('l', [-1]) * v_length
     v1[v_offset + 1] = 0
     v2 = v1[:]
     delta = text1_length - text2_length
@@ -284,9 +415,15 @@ class diff_match_patch:
     k1end = 0
     k2start = 0
     k2end = 0
+    # Hoist lookups out of the loops.
+    now = time.time
+    bisectSplit = self.diff_bisectSplit
+    check_interval = self.Diff_DeadlineInterval
     for d in range(max_d):
-      # Bail out if deadline is reached.
-      if time.time() > deadline:
+      # Bail out if deadline is reached.  Checking the clock is costly
+      # relative to a short d-iteration, so only look every few steps.
+      if d % check_interval == 0 and now() > deadline:
+        self.Diff_TimedOut = True
         break
 
       # Walk the front path one step.
@@ -298,10 +435,27 @@ class diff_match_patch:
         else:
           x1 = v1[k1_offset - 1] + 1
         y1 = x1 - k1
-        while (x1 < text1_length and y1 < text2_length and
-               text1[x1] == text2[y1]):
+        if (x1 < text1_length and y1 < text2_length and
+            text1[x1] == text2[y1]):
+          # Follow the snake by comparing slices of doubling, then
+          # halving, length rather than one character at a time.
+          remaining = min(text1_length - x1, text2_length - y1) - 1
           x1 += 1
           y1 += 1
+          step = 1
+          while (step <= remaining and
+                 text1[x1:x1 + step] == text2[y1:y1 + step]):
+            x1 += step
+            y1 += step
+            remaining -= step
+            step <<= 1
+          while step > 1:
+            step >>= 1
+            if (step <= remaining and
+                text1[x1:x1 + step] == text2[y1:y1 + step]):
+              x1 += step
+              y1 += step
+              remaining -= step
         v1[k1_offset] = x1
         if x1 > text1_length:
           # Ran off the right of the graph.
@@ -316,7 +470,7 @@ class diff_match_patch:
             x2 = text1_length - v2[k2_offset]
             if x1 >= x2:
               # Overlap detected.
-              return self.diff_bisectSplit(text1, text2, x1, y1, deadline)
+              return bisectSplit(text1, text2, x1, y1, deadline)
 
       # Walk the reverse path one step.
       for k2 in range(-d + k2start, d + 1 - k2end, 2):
@@ -327,10 +481,28 @@ class diff_match_patch:
         else:
           x2 = v2[k2_offset - 1] + 1
         y2 = x2 - k2
-        while (x2 < text1_length and y2 < text2_length and
-               text1[-x2 - 1] == text2[-y2 - 1]):
+        if (x2 < text1_length and y2 < text2_length and
+            text1[-x2 - 1] == text2[-y2 - 1]):
+          # As above, but matching backwards from the ends.
+          remaining = min(text1_length - x2, text2_length - y2) - 1
           x2 += 1
           y2 += 1
+          step = 1
+          while (step <= remaining and
+                 text1[text1_length - x2 - step:text1_length - x2] ==
+                 text2[text2_length - y2 - step:text2_length - y2]):
+            x2 += step
+            y2 += step
+            remaining -= step
+            step <<= 1
+          while step > 1:
+            step >>= 1
+            if (step <= remaining and
+                text1[text1_length - x2 - step:text1_length - x2] ==
+                text2[text2_length - y2 - step:text2_length - y2]):
+              x2 += step
+              y2 += step
+              remaining -= step
         v2[k2_offset] = x2
         if x2 > text1_length:
           # Ran off the left of the graph.
@@ -347,7 +519,7 @@ class diff_match_patch:
             x2 = text1_length - x2
             if x1 >= x2:
               # Overlap detected.
-              return self.diff_bisectSplit(text1, text2, x1, y1, deadline)
+              return bisectSplit(text1, text2, x1, y1, deadline)
 
     # Diff took too long and hit the deadline or
     # number of diffs equals number of characters, no commonality at all.
@@ -455,6 +627,170 @@ class diff_match_patch:
         text.append(lineArray[ord(char)])
       diffs[i] = (diffs[i][0], "".join(text))
 
+  def diff_linesToInts(self, text1, text2):
+    """Split two texts into lines and number each distinct line.  Unlike
+    diff_linesToChars, the lines themselves aren't kept: they can be sliced
+    back out of the texts by their offsets.
+
+    Args:
+      text1: First string.
+      text2: Second string.
+
+    Returns:
+      Four element tuple, containing arrays of the line ids of text1 and of
+      text2, and arrays of the offsets where each line of text1 and of text2
+      starts, each ending with the length of the text.
+    """
+    lineIds = {}  # e.g. lineIds["Hello\n"] == 4
+
+    def diff_linesToIntsMunge(text):
+      """Number the lines of a text.
+      Modifies lineIds through being a closure.
+
+      Args:
+        text: String to encode.
+
+      Returns:
+        Two element tuple of the line ids and the line start offsets.
+      """
+      ids = array.array('l')
+      starts = array.array('l')
+      lineStart = 0
+      while lineStart < len(text):
+        lineEnd = text.find('\n', lineStart) + 1 or len(text)
+        ids.append(lineIds.setdefault(text[lineStart:lineEnd], len(lineIds)))
+        starts.append(lineStart)
+        lineStart = lineEnd
+      starts.append(len(text))
+      return (ids, starts)
+
+    (ids1, starts1) = diff_linesToIntsMunge(text1)
+    (ids2, starts2) = diff_linesToIntsMunge(text2)
+    return (ids1, ids2, starts1, starts2)
+
+  def diff_lineIds(self, ids1, ids2, deadline=None):
+    """Find the differences between two arrays of line ids.  Regions are
+    split on their common ends and, for the histogram algorithm or when they
+    have too many distinct lines to encode as characters, on histogram
+    anchors.  What remains is encoded a character per line and passed to
+    diff_main.
+
+    Args:
+      ids1: Old line ids.
+      ids2: New line ids.
+      deadline: Optional time when the diff should be complete by.
+
+    Returns:
+      Array of tuples of an operation and a number of lines.
+    """
+    if deadline == None:
+      self.Diff_TimedOut = False
+      if self.Diff_Timeout <= 0:
+        deadline = sys.maxsize
+      else:
+        deadline = time.time() + self.Diff_Timeout
+
+    def diff_lineIdsCodes(region1, region2):
+      """Renumber the lines of two regions from 1, so they can be encoded as
+      characters.
+
+      Args:
+        region1: Old line ids.
+        region2: New line ids.
+
+      Returns:
+        Hash of line id to number, or None if there are too many to encode.
+      """
+      codes = {}
+      for line in region1:
+        codes.setdefault(line, len(codes) + 1)
+      for line in region2:
+        codes.setdefault(line, len(codes) + 1)
+      if len(codes) > 1114111:
+        return None
+      return codes
+
+    runs = []
+    # Runs, and regions still to diff, in reverse order.
+    stack = [(None, ids1, ids2)]
+    while stack:
+      item = stack.pop()
+      if item[0] is not None:
+        runs.append(item)
+        continue
+      (_, region1, region2) = item
+      # Trim off the common prefix and suffix.
+      prefix = self.diff_commonPrefix(region1, region2)
+      suffix = self.diff_commonSuffix(region1[prefix:], region2[prefix:])
+      if suffix:
+        stack.append((self.DIFF_EQUAL, suffix))
+      region1 = region1[prefix:len(region1) - suffix]
+      region2 = region2[prefix:len(region2) - suffix]
+      if prefix:
+        runs.append((self.DIFF_EQUAL, prefix))
+      if not region1 or not region2 or time.time() > deadline:
+        if region1 and region2:
+          self.Diff_TimedOut = True
+        if region1:
+          runs.append((self.DIFF_DELETE, len(region1)))
+        if region2:
+          runs.append((self.DIFF_INSERT, len(region2)))
+        continue
+
+      codes = None
+      if self.Diff_LineAlgorithm != 'histogram':
+        codes = diff_lineIdsCodes(region1, region2)
+      if codes is None:
+        anchor = self.diff_histogramAnchor(region1, region2)
+        if anchor is not None:
+          (start1, start2, length) = anchor
+          stack.append((None, region1[start1 + length:],
+                        region2[start2 + length:]))
+          stack.append((self.DIFF_EQUAL, length))
+          stack.append((None, region1[:start1], region2[:start2]))
+          continue
+        if self.Diff_LineAlgorithm == 'histogram':
+          codes = diff_lineIdsCodes(region1, region2)
+      if codes is None:
+        # Nothing to anchor on, and too varied to diff.
+        runs.append((self.DIFF_DELETE, len(region1)))
+        runs.append((self.DIFF_INSERT, len(region2)))
+        continue
+      # Number just this region's lines, which fit in characters.
+      chars1 = "".join([chr(codes[line]) for line in region1])
+      chars2 = "".join([chr(codes[line]) for line in region2])
+      for (op, text) in self.diff_main(chars1, chars2, False, deadline):
+        runs.append((op, len(text)))
+    return runs
+
+  def diff_runsToLines(self, runs, text1, text2, starts1, starts2):
+    """Turn runs of lines from diff_lineIds into a diff of the texts.
+
+    Args:
+      runs: Array of tuples of an operation and a number of lines.
+      text1: Old string.
+      text2: New string.
+      starts1: Line start offsets of text1, from diff_linesToInts.
+      starts2: Line start offsets of text2, from diff_linesToInts.
+
+    Returns:
+      Array of changes.
+    """
+    diffs = []
+    line1 = 0
+    line2 = 0
+    for (op, count) in runs:
+      if op == self.DIFF_INSERT:
+        diffs.append((op, text2[starts2[line2]:starts2[line2 + count]]))
+        line2 += count
+      else:
+        diffs.append((op, text1[starts1[line1]:starts1[line1 + count]]))
+        line1 += count
+        if op == self.DIFF_EQUAL:
+          line2 += count
+    self.diff_cleanupMerge(diffs)
+    return diffs
+
   def diff_commonPrefix(self, text1, text2):
     """Determine the common prefix of two strings.
 
@@ -646,49 +982,49 @@ class diff_match_patch:
       diffs: Array of diff tuples.
     """
     changes = False
-    equalities = []  # Stack of indices where equalities are found.
-    lastEquality = None  # Always equal to diffs[equalities[-1]][1]
-    pointer = 0  # Index of current position.
-    # Number of chars that changed prior to the equality.
-    length_insertions1, length_deletions1 = 0, 0
-    # Number of chars that changed after the equality.
-    length_insertions2, length_deletions2 = 0, 0
-    while pointer < len(diffs):
-      if diffs[pointer][0] == self.DIFF_EQUAL:  # Equality found.
-        equalities.append(pointer)
-        length_insertions1, length_insertions2 = length_insertions2, 0
-        length_deletions1, length_deletions2 = length_deletions2, 0
-        lastEquality = diffs[pointer][1]
-      else:  # An insertion or deletion.
-        if diffs[pointer][0] == self.DIFF_INSERT:
-          length_insertions2 += len(diffs[pointer][1])
+    # Stack of equalities still open to elimination, as tuples of their
+    # index in the output and the chars inserted and deleted before them.
+    equalities = []
+    output = []
+    eliminated = set()  # Indices of equalities turned into deletions.
+    # Number of chars that changed since the last equality.
+    length_insertions, length_deletions = 0, 0
+    for diff in diffs + [None]:  # None marks the end.
+      if diff is not None and diff[0] != self.DIFF_EQUAL:
+        if diff[0] == self.DIFF_INSERT:
+          length_insertions += len(diff[1])
         else:
-          length_deletions2 += len(diffs[pointer][1])
-        # Eliminate an equality that is smaller or equal to the edits on both
-        # sides of it.
-        if (lastEquality and (len(lastEquality) <=
+          length_deletions += len(diff[1])
+        output.append(diff)
+        continue
+      # The edits after the last equality are all known, so eliminate it if
+      # it's smaller or equal to the edits on both sides of it.  That merges
+      # the edits around it, so the equality before needs reevaluating too.
+      while equalities:
+        (index, length_insertions1, length_deletions1) = equalities[-1]
+        lastEquality = output[index][1]
+        if not (lastEquality and (len(lastEquality) <=
             max(length_insertions1, length_deletions1)) and
-            (len(lastEquality) <= max(length_insertions2, length_deletions2))):
-          # Duplicate record.
-          diffs.insert(equalities[-1], (self.DIFF_DELETE, lastEquality))
-          # Change second copy to insert.
-          diffs[equalities[-1] + 1] = (self.DIFF_INSERT,
-              diffs[equalities[-1] + 1][1])
-          # Throw away the equality we just deleted.
-          equalities.pop()
-          # Throw away the previous equality (it needs to be reevaluated).
-          if len(equalities):
-            equalities.pop()
-          if len(equalities):
-            pointer = equalities[-1]
-          else:
-            pointer = -1
-          # Reset the counters.
-          length_insertions1, length_deletions1 = 0, 0
-          length_insertions2, length_deletions2 = 0, 0
-          lastEquality = None
-          changes = True
-      pointer += 1
+            (len(lastEquality) <= max(length_insertions, length_deletions))):
+          break
+        output[index] = (self.DIFF_DELETE, lastEquality)
+        eliminated.add(index)
+        equalities.pop()
+        length_insertions += length_insertions1 + len(lastEquality)
+        length_deletions += length_deletions1 + len(lastEquality)
+        changes = True
+      if diff is not None:
+        equalities.append((len(output), length_insertions, length_deletions))
+        output.append(diff)
+        length_insertions, length_deletions = 0, 0
+
+    if changes:
+      # Add the insertion half of each eliminated equality.
+      diffs[:] = []
+      for (index, diff) in enumerate(output):
+        diffs.append(diff)
+        if index in eliminated:
+          diffs.append((self.DIFF_INSERT, diff[1]))
 
     # Normalize the diff.
     if changes:
@@ -701,37 +1037,42 @@ class diff_match_patch:
     # e.g: <del>xxxabc</del><ins>defxxx</ins>
     #   -> <ins>def</ins>xxx<del>abc</del>
     # Only extract an overlap if it is as big as the edit ahead or behind it.
-    pointer = 1
+    output = []
+    pointer = 0
     while pointer < len(diffs):
-      if (diffs[pointer - 1][0] == self.DIFF_DELETE and
-          diffs[pointer][0] == self.DIFF_INSERT):
-        deletion = diffs[pointer - 1][1]
-        insertion = diffs[pointer][1]
+      if (pointer + 1 < len(diffs) and
+          diffs[pointer][0] == self.DIFF_DELETE and
+          diffs[pointer + 1][0] == self.DIFF_INSERT):
+        deletion = diffs[pointer][1]
+        insertion = diffs[pointer + 1][1]
         overlap_length1 = self.diff_commonOverlap(deletion, insertion)
         overlap_length2 = self.diff_commonOverlap(insertion, deletion)
         if overlap_length1 >= overlap_length2:
           if (overlap_length1 >= len(deletion) / 2.0 or
               overlap_length1 >= len(insertion) / 2.0):
             # Overlap found.  Insert an equality and trim the surrounding edits.
-            diffs.insert(pointer, (self.DIFF_EQUAL,
-                                   insertion[:overlap_length1]))
-            diffs[pointer - 1] = (self.DIFF_DELETE,
-                                  deletion[:len(deletion) - overlap_length1])
-            diffs[pointer + 1] = (self.DIFF_INSERT,
-                                  insertion[overlap_length1:])
-            pointer += 1
+            output.append((self.DIFF_DELETE,
+                           deletion[:len(deletion) - overlap_length1]))
+            output.append((self.DIFF_EQUAL, insertion[:overlap_length1]))
+            output.append((self.DIFF_INSERT, insertion[overlap_length1:]))
+          else:
+            output += diffs[pointer:pointer + 2]
         else:
           if (overlap_length2 >= len(deletion) / 2.0 or
               overlap_length2 >= len(insertion) / 2.0):
             # Reverse overlap found.
             # Insert an equality and swap and trim the surrounding edits.
-            diffs.insert(pointer, (self.DIFF_EQUAL, deletion[:overlap_length2]))
-            diffs[pointer - 1] = (self.DIFF_INSERT,
-                                  insertion[:len(insertion) - overlap_length2])
-            diffs[pointer + 1] = (self.DIFF_DELETE, deletion[overlap_length2:])
-            pointer += 1
+            output.append((self.DIFF_INSERT,
+                           insertion[:len(insertion) - overlap_length2]))
+            output.append((self.DIFF_EQUAL, deletion[:overlap_length2]))
+            output.append((self.DIFF_DELETE, deletion[overlap_length2:]))
+          else:
+            output += diffs[pointer:pointer + 2]
+        pointer += 2
+      else:
+        output.append(diffs[pointer])
         pointer += 1
-      pointer += 1
+    diffs[:] = output
 
   def diff_cleanupSemanticLossless(self, diffs):
     """Look for single edits surrounded on both sides by equalities
@@ -857,29 +1198,36 @@ class diff_match_patch:
     """
     changes = False
     equalities = []  # Stack of indices where equalities are found.
-    lastEquality = None  # Always equal to diffs[equalities[-1]][1]
-    pointer = 0  # Index of current position.
+    lastEquality = None  # Always equal to output[equalities[-1]][1]
+    # The diffs behind the current position, and those ahead of it, in
+    # reverse so the next is at the end.  Backtracking moves diffs from one
+    # to the other rather than splicing the middle of a list.
+    output = []
+    pending = diffs[::-1]
+    barrier = -1  # Index of the last equality that wasn't a candidate.
     pre_ins = False  # Is there an insertion operation before the last equality.
     pre_del = False  # Is there a deletion operation before the last equality.
     post_ins = False  # Is there an insertion operation after the last equality.
     post_del = False  # Is there a deletion operation after the last equality.
-    while pointer < len(diffs):
-      if diffs[pointer][0] == self.DIFF_EQUAL:  # Equality found.
-        if (len(diffs[pointer][1]) < self.Diff_EditCost and
-            (post_ins or post_del)):
+    while pending:
+      diff = pending.pop()
+      output.append(diff)
+      if diff[0] == self.DIFF_EQUAL:  # Equality found.
+        if len(diff[1]) < self.Diff_EditCost and (post_ins or post_del):
           # Candidate found.
-          equalities.append(pointer)
+          equalities.append(len(output) - 1)
           pre_ins = post_ins
           pre_del = post_del
-          lastEquality = diffs[pointer][1]
+          lastEquality = diff[1]
         else:
           # Not a candidate, and can never become one.
           equalities = []
           lastEquality = None
+          barrier = len(output) - 1
 
         post_ins = post_del = False
       else:  # An insertion or deletion.
-        if diffs[pointer][0] == self.DIFF_DELETE:
+        if diff[0] == self.DIFF_DELETE:
           post_del = True
         else:
           post_ins = True
@@ -894,29 +1242,37 @@ class diff_match_patch:
         if lastEquality and ((pre_ins and pre_del and post_ins and post_del) or
                              ((len(lastEquality) < self.Diff_EditCost / 2) and
                               (pre_ins + pre_del + post_ins + post_del) == 3)):
-          # Duplicate record.
-          diffs.insert(equalities[-1], (self.DIFF_DELETE, lastEquality))
-          # Change second copy to insert.
-          diffs[equalities[-1] + 1] = (self.DIFF_INSERT,
-              diffs[equalities[-1] + 1][1])
-          equalities.pop()  # Throw away the equality we just deleted.
+          # Split the equality into a deletion and an insertion.
+          index = equalities.pop()  # Throw away the equality we just deleted.
+          edits = output[index + 1:]
+          del output[index:]
+          output.append((self.DIFF_DELETE, lastEquality))
+          output.append((self.DIFF_INSERT, lastEquality))
           lastEquality = None
           if pre_ins and pre_del:
             # No changes made which could affect previous entry, keep going.
+            output += edits
             post_ins = post_del = True
             equalities = []
           else:
+            pending += edits[::-1]
             if len(equalities):
               equalities.pop()  # Throw away the previous equality.
+            # Step back to just after the equality before that.  With none,
+            # rescanning from the start would only retrace everything up to
+            # the last non-candidate, which resets the state, so step back
+            # to there.
             if len(equalities):
-              pointer = equalities[-1]
+              pointer = equalities[-1] + 1
             else:
-              pointer = -1
+              pointer = barrier + 1
+            pending += output[pointer:][::-1]
+            del output[pointer:]
             post_ins = post_del = False
           changes = True
-      pointer += 1
 
     if changes:
+      diffs[:] = output
       self.diff_cleanupMerge(diffs)
 
   def diff_cleanupMerge(self, diffs):
@@ -926,99 +1282,102 @@ class diff_match_patch:
     Args:
       diffs: Array of diff tuples.
     """
-    diffs.append((self.DIFF_EQUAL, ''))  # Add a dummy entry at the end.
-    pointer = 0
+    output = []
+    edits = []  # The run of insertions and deletions since the last equality.
     count_delete = 0
     count_insert = 0
     text_delete = ''
     text_insert = ''
-    while pointer < len(diffs):
-      if diffs[pointer][0] == self.DIFF_INSERT:
+    # Add a dummy entry at the end.
+    for diff in diffs + [(self.DIFF_EQUAL, '')]:
+      if diff[0] == self.DIFF_INSERT:
+        edits.append(diff)
         count_insert += 1
-        text_insert += diffs[pointer][1]
-        pointer += 1
-      elif diffs[pointer][0] == self.DIFF_DELETE:
+        text_insert += diff[1]
+      elif diff[0] == self.DIFF_DELETE:
+        edits.append(diff)
         count_delete += 1
-        text_delete += diffs[pointer][1]
-        pointer += 1
-      elif diffs[pointer][0] == self.DIFF_EQUAL:
+        text_delete += diff[1]
+      elif diff[0] == self.DIFF_EQUAL:
         # Upon reaching an equality, check for prior redundancies.
         if count_delete + count_insert > 1:
           if count_delete != 0 and count_insert != 0:
             # Factor out any common prefixies.
             commonlength = self.diff_commonPrefix(text_insert, text_delete)
             if commonlength != 0:
-              x = pointer - count_delete - count_insert - 1
-              if x >= 0 and diffs[x][0] == self.DIFF_EQUAL:
-                diffs[x] = (diffs[x][0], diffs[x][1] +
-                            text_insert[:commonlength])
+              if output and output[-1][0] == self.DIFF_EQUAL:
+                output[-1] = (output[-1][0], output[-1][1] +
+                              text_insert[:commonlength])
               else:
-                diffs.insert(0, (self.DIFF_EQUAL, text_insert[:commonlength]))
-                pointer += 1
+                output.insert(0, (self.DIFF_EQUAL, text_insert[:commonlength]))
               text_insert = text_insert[commonlength:]
               text_delete = text_delete[commonlength:]
             # Factor out any common suffixies.
             commonlength = self.diff_commonSuffix(text_insert, text_delete)
             if commonlength != 0:
-              diffs[pointer] = (diffs[pointer][0], text_insert[-commonlength:] +
-                  diffs[pointer][1])
+              diff = (diff[0], text_insert[-commonlength:] + diff[1])
               text_insert = text_insert[:-commonlength]
               text_delete = text_delete[:-commonlength]
-          # Delete the offending records and add the merged ones.
-          new_ops = []
+          # Replace the offending records with the merged ones.
           if len(text_delete) != 0:
-            new_ops.append((self.DIFF_DELETE, text_delete))
+            output.append((self.DIFF_DELETE, text_delete))
           if len(text_insert) != 0:
-            new_ops.append((self.DIFF_INSERT, text_insert))
-          pointer -= count_delete + count_insert
-          diffs[pointer : pointer + count_delete + count_insert] = new_ops
-          pointer += len(new_ops) + 1
-        elif pointer != 0 and diffs[pointer - 1][0] == self.DIFF_EQUAL:
+            output.append((self.DIFF_INSERT, text_insert))
+          output.append(diff)
+        elif edits:
+          output += edits
+          output.append(diff)
+        elif output and output[-1][0] == self.DIFF_EQUAL:
           # Merge this equality with the previous one.
-          diffs[pointer - 1] = (diffs[pointer - 1][0],
-                                diffs[pointer - 1][1] + diffs[pointer][1])
-          del diffs[pointer]
+          output[-1] = (output[-1][0], output[-1][1] + diff[1])
         else:
-          pointer += 1
+          output.append(diff)
 
+        edits = []
         count_insert = 0
         count_delete = 0
         text_delete = ''
         text_insert = ''
 
-    if diffs[-1][1] == '':
-      diffs.pop()  # Remove the dummy entry at the end.
+    if output[-1][1] == '':
+      output.pop()  # Remove the dummy entry at the end.
 
     # Second pass: look for single edits surrounded on both sides by equalities
     # which can be shifted sideways to eliminate an equality.
     # e.g: A<ins>BA</ins>C -> <ins>AB</ins>AC
     changes = False
+    diffs[:] = output[:1]
     pointer = 1
     # Intentionally ignore the first and last element (don't need checking).
-    while pointer < len(diffs) - 1:
-      if (diffs[pointer - 1][0] == self.DIFF_EQUAL and
-          diffs[pointer + 1][0] == self.DIFF_EQUAL):
+    while pointer < len(output) - 1:
+      if (diffs[-1][0] == self.DIFF_EQUAL and
+          output[pointer + 1][0] == self.DIFF_EQUAL):
         # This is a single edit surrounded by equalities.
-        if diffs[pointer][1].endswith(diffs[pointer - 1][1]):
+        if output[pointer][1].endswith(diffs[-1][1]):
           # Shift the edit over the previous equality.
-          if diffs[pointer - 1][1] != "":
-            diffs[pointer] = (diffs[pointer][0],
-                diffs[pointer - 1][1] +
-                diffs[pointer][1][:-len(diffs[pointer - 1][1])])
-            diffs[pointer + 1] = (diffs[pointer + 1][0],
-                                  diffs[pointer - 1][1] + diffs[pointer + 1][1])
-          del diffs[pointer - 1]
+          previous = diffs.pop()
+          if previous[1] != "":
+            diffs.append((output[pointer][0],
+                previous[1] + output[pointer][1][:-len(previous[1])]))
+            diffs.append((output[pointer + 1][0],
+                          previous[1] + output[pointer + 1][1]))
+          else:
+            diffs += output[pointer:pointer + 2]
+          pointer += 2
           changes = True
-        elif diffs[pointer][1].startswith(diffs[pointer + 1][1]):
+          continue
+        elif output[pointer][1].startswith(output[pointer + 1][1]):
           # Shift the edit over the next equality.
-          diffs[pointer - 1] = (diffs[pointer - 1][0],
-                                diffs[pointer - 1][1] + diffs[pointer + 1][1])
-          diffs[pointer] = (diffs[pointer][0],
-              diffs[pointer][1][len(diffs[pointer + 1][1]):] +
-              diffs[pointer + 1][1])
-          del diffs[pointer + 1]
+          diffs[-1] = (diffs[-1][0], diffs[-1][1] + output[pointer + 1][1])
+          diffs.append((output[pointer][0],
+              output[pointer][1][len(output[pointer + 1][1]):] +
+              output[pointer + 1][1]))
+          pointer += 2
           changes = True
+          continue
+      diffs.append(output[pointer])
       pointer += 1
+    diffs += output[pointer:]
 
     # If shifts were made, the diff needs reordering and another shift sweep.
     if changes:
@@ -1251,7 +1610,8 @@ class diff_match_patch:
     Returns:
       Best match index or -1.
     """
-    # Python doesn't have a maxint limit, so ignore this check.
+    # Python doesn't have a maxint limit, so ignore this check.  Patterns
+    # are only wider than Match_MaxBits with Match_Unbounded.
     #if self.Match_MaxBits != 0 and len(pattern) > self.Match_MaxBits:
     #  raise ValueError("Pattern too long for this application.")
 
@@ -1368,7 +1728,7 @@ class diff_match_patch:
     but don't let the pattern expand beyond Match_MaxBits.
 
     Args:
-      patch: The patch to grow.
+      patch: The patch to grow, in place, so not a frozen_patch.
       text: Source text.
     """
     if len(text) == 0:
@@ -1530,7 +1890,7 @@ class diff_match_patch:
     for patch in patches:
       patchCopy = patch_obj()
       # No need to deep copy the tuples since they are immutable.
-      patchCopy.diffs = patch.diffs[:]
+      patchCopy.diffs = list(patch.diffs)
       patchCopy.start1 = patch.start1
       patchCopy.start2 = patch.start2
       patchCopy.length1 = patch.length1
@@ -1552,10 +1912,11 @@ class diff_match_patch:
     if not patches:
       return (text, [])
 
-    # Deep copy the patches so that no changes are made to originals.
-    patches = self.patch_deepCopy(patches)
+    # The patches themselves are never changed; padding and splitting
+    # replace them in a copy of the list.
+    patches = list(patches)
 
-    nullPadding = self.patch_addPadding(patches)
+    nullPadding = self._patch_padCopies(patches)
     text = nullPadding + text + nullPadding
     self.patch_splitMax(patches)
 
@@ -1565,11 +1926,17 @@ class diff_match_patch:
     # has an effective expected position of 22.
     delta = 0
     results = []
+    # Patches longer than this are located by their ends.
+    if self.Match_Unbounded:
+      max_bits = 0
+    else:
+      max_bits = self.Match_MaxBits
     for patch in patches:
-      expected_loc = patch.start2 + delta
-      text1 = self.diff_text1(patch.diffs)
+      # Patch locations don't count the padding.
+      expected_loc = patch.start2 + len(nullPadding) + delta
+      text1 = patch.text1
       end_loc = -1
-      if len(text1) > self.Match_MaxBits:
+      if max_bits != 0 and len(text1) > max_bits:
         # patch_splitMax will only provide an oversized pattern in the case of
         # a monster delete.
         start_loc = self.match_main(text, text1[:self.Match_MaxBits],
@@ -1597,13 +1964,13 @@ class diff_match_patch:
           text2 = text[start_loc : end_loc + self.Match_MaxBits]
         if text1 == text2:
           # Perfect match, just shove the replacement text in.
-          text = (text[:start_loc] + self.diff_text2(patch.diffs) +
+          text = (text[:start_loc] + patch.text2 +
                       text[start_loc + len(text1):])
         else:
           # Imperfect match.
           # Run a diff to get a framework of equivalent indices.
           diffs = self.diff_main(text1, text2, False)
-          if (len(text1) > self.Match_MaxBits and
+          if (end_loc != -1 and
               self.diff_levenshtein(diffs) / float(len(text1)) >
               self.Patch_DeleteThreshold):
             # The end points match, but the content is unacceptably bad.
@@ -1641,6 +2008,11 @@ class diff_match_patch:
     for x in range(1, paddingLength + 1):
       nullPadding += chr(x)
 
+    # Frozen patches can't be moved in place, so thaw them.
+    for x in range(len(patches)):
+      if isinstance(patches[x], frozen_patch):
+        patches[x] = self.patch_deepCopy([patches[x]])[0]
+
     # Bump all the patches forward.
     for patch in patches:
       patch.start1 += paddingLength
@@ -1684,16 +2056,80 @@ class diff_match_patch:
 
     return nullPadding
 
+  def _patch_padCopies(self, patches):
+    """As patch_addPadding, but the first and last patches are replaced with
+    padded copies, and locations are left as they were so the caller adds
+    the padding length to them.  Only patch_apply uses it.
+
+    Args:
+      patches: Array of Patch objects.
+
+    Returns:
+      The padding string added to each side.
+    """
+    paddingLength = self.Patch_Margin
+    nullPadding = ""
+    for x in range(1, paddingLength + 1):
+      nullPadding += chr(x)
+
+    # Add some padding on start of first diff.
+    patch = patches[0]
+    diffs = list(patch.diffs)
+    start1 = patch.start1
+    start2 = patch.start2
+    length1 = patch.length1
+    length2 = patch.length2
+    if not diffs or diffs[0][0] != self.DIFF_EQUAL:
+      # Add nullPadding equality.
+      diffs.insert(0, (self.DIFF_EQUAL, nullPadding))
+      start1 -= paddingLength
+      start2 -= paddingLength
+      length1 += paddingLength
+      length2 += paddingLength
+    elif paddingLength > len(diffs[0][1]):
+      # Grow first equality.
+      extraLength = paddingLength - len(diffs[0][1])
+      newText = nullPadding[len(diffs[0][1]):] + diffs[0][1]
+      diffs[0] = (diffs[0][0], newText)
+      start1 -= extraLength
+      start2 -= extraLength
+      length1 += extraLength
+      length2 += extraLength
+    patches[0] = frozen_patch(diffs, start1, start2, length1, length2)
+
+    # Add some padding on end of last diff.
+    patch = patches[-1]
+    diffs = list(patch.diffs)
+    length1 = patch.length1
+    length2 = patch.length2
+    if not diffs or diffs[-1][0] != self.DIFF_EQUAL:
+      # Add nullPadding equality.
+      diffs.append((self.DIFF_EQUAL, nullPadding))
+      length1 += paddingLength
+      length2 += paddingLength
+    elif paddingLength > len(diffs[-1][1]):
+      # Grow last equality.
+      extraLength = paddingLength - len(diffs[-1][1])
+      newText = diffs[-1][1] + nullPadding[:extraLength]
+      diffs[-1] = (diffs[-1][0], newText)
+      length1 += extraLength
+      length2 += extraLength
+    patches[-1] = frozen_patch(diffs, patch.start1, patch.start2,
+                               length1, length2)
+
+    return nullPadding
+
   def patch_splitMax(self, patches):
     """Look through the patches and break up any which are longer than the
     maximum limit of the match algorithm.
-    Intended to be called only from within patch_apply.
+    Intended to be called only from within patch_apply.  Big patches are
+    replaced in the list rather than changed.
 
     Args:
       patches: Array of Patch objects.
     """
     patch_size = self.Match_MaxBits
-    if patch_size == 0:
+    if patch_size == 0 or self.Match_Unbounded:
       # Python has the option of not splitting strings due to its ability
       # to handle integers of arbitrary precision.
       return
@@ -1706,8 +2142,9 @@ class diff_match_patch:
       x -= 1
       start1 = bigpatch.start1
       start2 = bigpatch.start2
+      bigdiffs = list(bigpatch.diffs)
       precontext = ''
-      while len(bigpatch.diffs) != 0:
+      while len(bigdiffs) != 0:
         # Create one of several smaller patches.
         patch = patch_obj()
         empty = True
@@ -1717,14 +2154,14 @@ class diff_match_patch:
           patch.length1 = patch.length2 = len(precontext)
           patch.diffs.append((self.DIFF_EQUAL, precontext))
 
-        while (len(bigpatch.diffs) != 0 and
+        while (len(bigdiffs) != 0 and
                patch.length1 < patch_size - self.Patch_Margin):
-          (diff_type, diff_text) = bigpatch.diffs[0]
+          (diff_type, diff_text) = bigdiffs[0]
           if diff_type == self.DIFF_INSERT:
             # Insertions are harmless.
             patch.length2 += len(diff_text)
             start2 += len(diff_text)
-            patch.diffs.append(bigpatch.diffs.pop(0))
+            patch.diffs.append(bigdiffs.pop(0))
             empty = False
           elif (diff_type == self.DIFF_DELETE and len(patch.diffs) == 1 and
               patch.diffs[0][0] == self.DIFF_EQUAL and
@@ -1734,7 +2171,7 @@ class diff_match_patch:
             start1 += len(diff_text)
             empty = False
             patch.diffs.append((diff_type, diff_text))
-            del bigpatch.diffs[0]
+            del bigdiffs[0]
           else:
             # Deletion or equality.  Only take as much as we can stomach.
             diff_text = diff_text[:patch_size - patch.length1 -
@@ -1748,17 +2185,17 @@ class diff_match_patch:
               empty = False
 
             patch.diffs.append((diff_type, diff_text))
-            if diff_text == bigpatch.diffs[0][1]:
-              del bigpatch.diffs[0]
+            if diff_text == bigdiffs[0][1]:
+              del bigdiffs[0]
             else:
-              bigpatch.diffs[0] = (bigpatch.diffs[0][0],
-                                   bigpatch.diffs[0][1][len(diff_text):])
+              bigdiffs[0] = (bigdiffs[0][0],
+                                   bigdiffs[0][1][len(diff_text):])
 
         # Compute the head context for the next patch.
         precontext = self.diff_text2(patch.diffs)
         precontext = precontext[-self.Patch_Margin:]
         # Append the end context for this patch.
-        postcontext = self.diff_text1(bigpatch.diffs)[:self.Patch_Margin]
+        postcontext = self.diff_text1(bigdiffs)[:self.Patch_Margin]
         if postcontext:
           patch.length1 += len(postcontext)
           patch.length2 += len(postcontext)
@@ -1783,15 +2220,17 @@ class diff_match_patch:
     """
     text = []
     for patch in patches:
-      text.append(str(patch))
+      patch.appendText(text)
     return "".join(text)
 
-  def patch_fromText(self, textline):
+  def patch_fromText(self, textline, frozen=False):
     """Parse a textual representation of patches and return a list of patch
     objects.
 
     Args:
       textline: Text representation of patches.
+      frozen: Optional flag to return immutable frozen_patch objects, which
+          take less memory, for patches that will only be applied.
 
     Returns:
       Array of Patch objects.
@@ -1803,59 +2242,68 @@ class diff_match_patch:
     if not textline:
       return patches
     text = textline.split('\n')
-    while len(text) != 0:
-      m = re.match(r"^@@ -(\d+),?(\d*) \+(\d+),?(\d*) @@$", text[0])
+    unquote = urllib.parse.unquote
+    pointer = 0
+    while pointer < len(text):
+      m = PATCH_HEADER.match(text[pointer])
       if not m:
-        raise ValueError("Invalid patch string: " + text[0])
-      patch = patch_obj()
-      patches.append(patch)
-      patch.start1 = int(m.group(1))
+        raise ValueError("Invalid patch string: " + text[pointer])
+      diffs = []
+      start1 = int(m.group(1))
       if m.group(2) == '':
-        patch.start1 -= 1
-        patch.length1 = 1
+        start1 -= 1
+        length1 = 1
       elif m.group(2) == '0':
-        patch.length1 = 0
+        length1 = 0
       else:
-        patch.start1 -= 1
-        patch.length1 = int(m.group(2))
+        start1 -= 1
+        length1 = int(m.group(2))
 
-      patch.start2 = int(m.group(3))
+      start2 = int(m.group(3))
       if m.group(4) == '':
-        patch.start2 -= 1
-        patch.length2 = 1
+        start2 -= 1
+        length2 = 1
       elif m.group(4) == '0':
-        patch.length2 = 0
+        length2 = 0
       else:
-        patch.start2 -= 1
-        patch.length2 = int(m.group(4))
+        start2 -= 1
+        length2 = int(m.group(4))
 
-      del text[0]
+      pointer += 1
 
-      while len(text) != 0:
-        if text[0]:
-          sign = text[0][0]
-        else:
-          sign = ''
-        line = urllib.parse.unquote(text[0][1:])
+      while pointer < len(text):
+        line = text[pointer]
+        sign = line[:1]
+        if sign == '@':
+          # Start of next patch.
+          break
+        line = unquote(line[1:])
         if sign == '+':
           # Insertion.
-          patch.diffs.append((self.DIFF_INSERT, line))
+          diffs.append((self.DIFF_INSERT, line))
         elif sign == '-':
           # Deletion.
-          patch.diffs.append((self.DIFF_DELETE, line))
+          diffs.append((self.DIFF_DELETE, line))
         elif sign == ' ':
           # Minor equality.
-          patch.diffs.append((self.DIFF_EQUAL, line))
-        elif sign == '@':
-          # Start of next patch.
-          break
+          diffs.append((self.DIFF_EQUAL, line))
         elif sign == '':
           # Blank line?  Whatever.
           pass
         else:
           # WTF?
           raise ValueError("Invalid patch mode: '%s'\n%s" % (sign, line))
-        del text[0]
+        pointer += 1
+      if frozen:
+        patch = frozen_patch(diffs, start1, start2, length1, length2)
+      else:
+        patch = patch_obj()
+        patch.diffs = diffs
+        patch.start1 = start1
+        patch.start2 = start2
+        patch.length1 = length1
+        patch.length2 = length2
+      patches.append(patch)
     return patches
 
 
@@ -1863,6 +2311,8 @@ class patch_obj:
   """Class representing one patch operation.
   """
 
+  __slots__ = ('diffs', 'start1', 'start2', 'length1', 'length2')
+
   def __init__(self):
     """Initializes with an empty list of diffs.
     """
@@ -1872,6 +2322,18 @@ class patch_obj:
     self.length1 = 0
     self.length2 = 0
 
+  @property
+  def text1(self):
+    """The source text of the patch."""
+    return "".join(data for (op, data) in self.diffs
+                   if op != diff_match_patch.DIFF_INSERT)
+
+  @property
+  def text2(self):
+    """The destination text of the patch."""
+    return "".join(data for (op, data) in self.diffs
+                   if op != diff_match_patch.DIFF_DELETE)
+
   def __str__(self):
     """Emulate GNU diff's format.
     Header: @@ -382,8 +481,9 @@
@@ -1880,28 +2342,98 @@ class patch_obj:
     Returns:
       The GNU diff string.
     """
+    text = []
+    self.appendText(text)
+    return "".join(text)
+
+  def appendText(self, text):
+    """Append the GNU diff format of the patch to a list of strings.
+
+    Args:
+      text: List of strings to extend.
+    """
     if self.length1 == 0:
-      coords1 = str(self.start1) + ",0"
+      coords1 = "%s,0" % self.start1
     elif self.length1 == 1:
-      coords1 = str(self.start1 + 1)
+      coords1 = "%s" % (self.start1 + 1)
     else:
-      coords1 = str(self.start1 + 1) + "," + str(self.length1)
+      coords1 = "%s,%s" % (self.start1 + 1, self.length1)
     if self.length2 == 0:
-      coords2 = str(self.start2) + ",0"
+      coords2 = "%s,0" % self.start2
     elif self.length2 == 1:
-      coords2 = str(self.start2 + 1)
+      coords2 = "%s" % (self.start2 + 1)
     else:
-      coords2 = str(self.start2 + 1) + "," + str(self.length2)
-    text = ["@@ -", coords1, " +", coords2, " @@\n"]
+      coords2 = "%s,%s" % (self.start2 + 1, self.length2)
+    text.append("@@ -%s +%s @@\n" % (coords1, coords2))
     # Escape the body of the patch with %xx notation.
     for (op, data) in self.diffs:
+      data = data.translate(PATCH_ESCAPES)
+      if NON_ASCII.search(data):
+        # High ascii is escaped as the %xx of its UTF-8 bytes.
+        data = NON_ASCII.sub(patch_escapeRun, data)
       if op == diff_match_patch.DIFF_INSERT:
-        text.append("+")
+        text.append("+" + data + "\n")
       elif op == diff_match_patch.DIFF_DELETE:
-        text.append("-")
+        text.append("-" + data + "\n")
       elif op == diff_match_patch.DIFF_EQUAL:
-        text.append(" ")
-      # High ascii will raise UnicodeDecodeError.  Use Unicode instead.
-      data = data.encode("utf-8")
-      text.append(urllib.parse.quote(data, "!~*'();/?:@&=+$,# ") + "\n")
-    return "".join(text)
+        text.append(" " + data + "\n")
+      else:
+        text.append(data + "\n")
+
+
+def patch_escapeRun(match):
+  """%xx-escape the UTF-8 bytes of a run of non-ASCII characters.
+
+  Args:
+    match: Regular expression match of the run.
+
+  Returns:
+    The escaped run.
+  """
+  return "".join(["%%%02X" % byte for byte in match.group().encode("utf-8")])
+
+
+class frozen_patch:
+  """Class representing one patch operation which can't be changed, as
+  returned by patch_fromText(textline, frozen=True).  Being immutable it can
+  be applied without being copied first, and it joins its source and
+  destination texts once.
+  """
+
+  __slots__ = ('diffs', 'start1', 'start2', 'length1', 'length2',
+               '_text1', '_text2')
+
+  def __init__(self, diffs, start1, start2, length1, length2):
+    """Initializes from the diff tuples and coordinates of the patch.
+    """
+    initialize = object.__setattr__
+    initialize(self, 'diffs', tuple(diffs))
+    initialize(self, 'start1', start1)
+    initialize(self, 'start2', start2)
+    initialize(self, 'length1', length1)
+    initialize(self, 'length2', length2)
+    initialize(self, '_text1', None)
+    initialize(self, '_text2', None)
+
+  def __setattr__(self, name, value):
+    raise AttributeError("frozen_patch is immutable")
+
+  def __delattr__(self, name):
+    raise AttributeError("frozen_patch is immutable")
+
+  @property
+  def text1(self):
+    """The source text of the patch."""
+    if self._text1 is None:
+      object.__setattr__(self, '_text1', patch_obj.text1.fget(self))
+    return self._text1
+
+  @property
+  def text2(self):
+    """The destination text of the patch."""
+    if self._text2 is None:
+      object.__setattr__(self, '_text2', patch_obj.text2.fget(self))
+    return self._text2
+
+  __str__ = patch_obj.__str__
+  appendText = patch_obj.appendText
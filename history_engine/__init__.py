@@ -0,0 +1 @@
+from .history_engine import record, head, state_at, changes_between, compact
@@ -0,0 +1,146 @@
+"""
+Maintain _diff histories without the editor:
+
+    python -m history_engine verify  <path>...
+    python -m history_engine compact <path>... --keep-days 30 --interval 3600
+    python -m history_engine rebuild <path>...
+    python -m history_engine restore <file> <timestamp> [--output <path>]
+
+Paths are files or directories; directories are searched for 
+_diff histories. Files are processed across a process pool.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import os
+import sys
+import time
+
+from . import history_engine as engine
+
+
+def find_histories(paths):
+    """
+    The source filename of every history under paths.
+    """
+    filenames = []
+    for path in paths:
+        if os.path.isfile(path):
+            filenames.append(os.path.abspath(path))
+            continue
+        for dirpath, dirnames, names in os.walk(path):
+            if os.path.basename(dirpath) != '_diff':
+                continue
+            for name in names:
+                if name.endswith('.diff'):
+                    filenames.append(os.path.abspath(os.path.join(
+                        os.path.dirname(dirpath), 
+                        name[:-len('.diff')])))
+    return sorted(filenames)
+
+def run_verify(filename, args):
+    problems = engine.verify(filename)
+    return not problems, '; '.join(problems) or 'ok'
+
+def run_compact(filename, args):
+    keep_after = int(time.time()) - args.keep_days * 86400
+    before, after = engine.compact(filename, keep_after, args.interval, args.dry_run)
+    return True, '%d -> %d records' % (before, after)
+
+def run_rebuild(filename, args):
+    if args.dry_run:
+        return True, 'would rebuild'
+    engine.rebuild_side_files(filename)
+    return True, 'rebuilt'
+
+def run_restore(filename, args):
+    state = engine.state_at(filename, args.timestamp)
+    output = args.output or filename
+    if not args.dry_run:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(state)
+    return True, '%d characters to %s' % (len(state), output)
+
+def process(action, filename, args):
+    """
+    Run one action on one file in a worker, timing it and 
+    counting its diff timeouts.
+    """
+    engine.diff_stats.clear()
+    start = time.time()
+    try:
+        ok, message = action(filename, args)
+    except Exception as e:
+        ok, message = False, '%s: %s' % (type(e).__name__, e)
+    size = os.path.getsize(engine.side_file(filename, '.diff')) \
+        if os.path.exists(engine.side_file(filename, '.diff')) else 0
+    return filename, ok, message, time.time() - start, size, dict(engine.diff_stats)
+
+ACTIONS = {
+    'verify': run_verify,
+    'compact': run_compact,
+    'rebuild': run_rebuild,
+    'restore': run_restore,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='history_engine', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('action', choices=sorted(ACTIONS))
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--keep-days', type=int, default=30,
+        help='compact: keep every snapshot newer than this')
+    parser.add_argument('--interval', type=int, default=3600,
+        help='compact: keep one older snapshot per this many seconds')
+    parser.add_argument('--output',
+        help='restore: write here instead of over the file')
+    args = parser.parse_args(argv)
+
+    if args.action == 'restore':
+        if len(args.paths) != 2:
+            parser.error('restore takes a file and a timestamp')
+        try:
+            args.timestamp = int(args.paths[1])
+        except ValueError:
+            parser.error('timestamp must be an integer: %r' % args.paths[1])
+        filenames = [os.path.abspath(args.paths[0])]
+    else:
+        filenames = find_histories(args.paths)
+
+    start = time.time()
+    failures = 0
+    total_size = 0
+    diff_stats = collections.defaultdict(collections.Counter)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(process, ACTIONS[args.action], filename, args) 
+            for filename in filenames]
+        for future in concurrent.futures.as_completed(futures):
+            filename, ok, message, seconds, size, stats = future.result()
+            total_size += size
+            for kind, counts in stats.items():
+                diff_stats[kind].update(counts)
+            failures += not ok
+            print('%8.3fs  %s  %s%s' % (
+                seconds, 
+                'ok  ' if ok else 'FAIL', 
+                filename, 
+                '' if message == 'ok' else '  (%s)' % message))
+    elapsed = time.time() - start
+    print('%d files, %.1f MB in %.2fs (%.1f files/s, %.2f MB/s)%s, %d failed' % (
+        len(filenames),
+        total_size / 1e6,
+        elapsed,
+        len(filenames) / elapsed if elapsed else 0,
+        total_size / 1e6 / elapsed if elapsed else 0,
+        ' [dry run]' if args.dry_run else '',
+        failures))
+    for line in engine.diff_timeout_report(diff_stats):
+        print(line)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1516 @@
+"""
+History engine for Diff History.
+
+Records snapshots of a file as patches in _diff/<name>.diff and
+rebuilds, compares and maintains them. Nothing here imports the
+sublime API, so it can be used, tested and profiled anywhere.
+"""
+
+import time
+import datetime
+import os
+import json
+import bisect
+import array
+import collections
+import concurrent.futures
+import multiprocessing
+import re
+import hashlib
+import subprocess
+import difflib
+try:
+    from .. import diff_match_patch as dmp_module
+except (ImportError, ValueError): # imported outside the Sublime package
+    import diff_match_patch as dmp_module
+
+TS_FORMAT = '%a., %b. %d, %Y, %I:%M %p'
+CHECKPOINT_INTERVAL = 100
+MAX_CHECKPOINTS = 32
+COMPARISON_CACHE_SIZE = 32
+TIMELINE_BLOCK_SIZE = 65536
+EXPORT_READ_SIZE = 1 << 20
+EXPORT_GIT_BRANCH = 'diff-history'
+HISTORY_EXTENSIONS = ('.diff', '.index', '.blame', '.meta', '.identity')
+
+TOKEN_PATTERN = re.compile(r'\w\w+')
+# line diff algorithm by file extension; anything else uses myers
+LINE_DIFF_ALGORITHMS = { extension : 'histogram' for extension in (
+    '.py', '.js', '.jsx', '.ts', '.tsx', '.c', '.h', '.cc', '.cpp', '.hpp',
+    '.cs', '.java', '.kt', '.go', '.rs', '.swift', '.php', '.rb', '.css',
+    '.scss', '.html', '.xml', '.json', '.sh') }
+# seconds a diff may run before settling for a coarser one, as
+# (minimum, maximum); in between it grows with the texts by
+# DIFF_BUDGET_PER_MB. Snapshots are taken in the background at
+# every pause in typing, so they get little; comparisons are 
+# asked for and waited on.
+DIFF_BUDGETS = {
+    'snapshot': (0.05, 0.5),
+    'rewrite': (0.25, 2.0),
+    'compare': (1.0, 10.0) }
+DIFF_BUDGET_PER_MB = 1.0
+# replays shorter than this stay in-process even with workers
+WORKER_MIN_REPLAY = 16
+HUNK_HEADER = re.compile(r'^@@ -(\d+),?(\d*) \+(\d+),?(\d*) @@$', re.M)
+
+# filename -> [origin timestamp, {timestamp: state}, timestamp 
+# of the one state kept off the checkpoint interval, or None]
+state_checkpoints = {}
+# filename -> last disk_state() recorded in the history
+disk_states = {}
+# (filename, from timestamp, to timestamp) -> diffs
+comparison_cache = collections.OrderedDict()
+# diff kind -> counts of diffs, timeouts and fallbacks
+diff_stats = collections.defaultdict(collections.Counter)
+# process pool for diffs and replays, from start_workers()
+worker_pool = None
+
+def patcher():
+    """
+    A diff_match_patch that applies each hunk whole rather than
+    in Match_MaxBits pieces, so big pastes and deletions replay
+    in one step.
+    """
+    dmp = dmp_module.diff_match_patch()
+    dmp.Match_Unbounded = True
+    return dmp
+
+def differ(filename):
+    """
+    A diff_match_patch using the line diff algorithm for the
+    file's type.
+    """
+    dmp = patcher()
+    dmp.Diff_LineAlgorithm = LINE_DIFF_ALGORITHMS.get(
+        os.path.splitext(filename)[1].lower(), 'myers')
+    return dmp
+
+def start_workers(workers, executable=None):
+    """
+    Run diffs and replays in a pool of worker processes instead
+    of the calling thread, so they spread across cores and 
+    leave this interpreter free. executable is the Python for
+    the workers, for hosts whose sys.executable isn't one.
+    """
+    global worker_pool
+    stop_workers()
+    context = multiprocessing.get_context('spawn')
+    if executable:
+        context.set_executable(executable)
+    worker_pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, 
+        mp_context=context)
+
+def stop_workers():
+    global worker_pool
+    if worker_pool is not None:
+        worker_pool.shutdown(wait=False)
+        worker_pool = None
+
+def in_workers(function, *args):
+    """
+    function(*args), in the worker pool if one is running.
+    """
+    if worker_pool is None:
+        return function(*args)
+    return worker_pool.submit(function, *args).result()
+
+def diff_budget(kind, size):
+    """
+    Diff_Timeout for a diff of kind over size characters.
+    """
+    minimum, maximum = DIFF_BUDGETS[kind]
+    return min(maximum, minimum + size / 1e6 * DIFF_BUDGET_PER_MB)
+
+def make_patches(dmp, old, new, kind):
+    """
+    Patches from old to new within the diff budget for kind. A 
+    diff that runs out of time is redone line by line, and if
+    that runs out too, what's left is patched as whole blocks:
+    coarser, but still correct.
+    """
+    stats = diff_stats[kind]
+    stats['diffs'] += 1
+    dmp.Diff_Timeout = diff_budget(kind, len(old) + len(new))
+    diffs = dmp.diff_main(old, new)
+    if not dmp.Diff_TimedOut:
+        if len(diffs) > 2:
+            dmp.diff_cleanupSemantic(diffs)
+            dmp.diff_cleanupEfficiency(diffs)
+        return dmp.patch_make(old, diffs)
+    stats['timeouts'] += 1
+    ids1, ids2, starts1, starts2 = dmp.diff_linesToInts(old, new)
+    runs = dmp.diff_lineIds(ids1, ids2)
+    stats['coarse' if dmp.Diff_TimedOut else 'lines'] += 1
+    return dmp.patch_make(old, dmp.diff_runsToLines(runs, old, new, starts1, starts2))
+
+def patch_record(filename, old, new, kind):
+    """
+    make_patches as a history record, with the diff_stats it 
+    added; the work a worker does for a snapshot.
+    """
+    diff_stats.clear()
+    dmp = differ(filename)
+    patch_text = dmp.patch_toText(make_patches(dmp, old, new, kind))
+    return patch_text, dict(diff_stats[kind])
+
+def snapshot_patches(dmp, filename, old, new, kind):
+    """
+    The patch group from old to new and its history record,
+    diffed by a worker if there are any.
+    """
+    if worker_pool is None:
+        patch_group = make_patches(dmp, old, new, kind)
+        return patch_group, dmp.patch_toText(patch_group)
+    patch_text, stats = in_workers(patch_record, filename, old, new, kind)
+    diff_stats[kind].update(stats)
+    return dmp.patch_fromText(patch_text, frozen=True), patch_text
+
+def diff_timeout_report(stats=None):
+    """
+    A line per kind of diff on how often it ran out of time,
+    from stats or everything diffed in this process.
+    """
+    if stats is None:
+        stats = diff_stats
+    return ['%s: %d of %d diffs timed out (%.1f%%), %d redone by line, %d coarse' % (
+                kind, 
+                counts['timeouts'], 
+                counts['diffs'], 
+                100.0 * counts['timeouts'] / counts['diffs'],
+                counts['lines'],
+                counts['coarse'])
+            for kind, counts in sorted(stats.items()) if counts['diffs']]
+
+def record(filename, contents, folder=None, trigger=None):
+    """
+    Record contents as the newest snapshot of filename, unless 
+    it matches the head.
+    """
+    dmp = differ(filename)
+
+    file_history = get_history(filename)
+    contents_hash = content_hash(contents)
+    if not file_history:
+        timestamp = int(time.time())
+        write_history(filename, { timestamp : contents })
+        write_side_file(filename, '.meta', { timestamp : snapshot_metadata(
+            contents, 
+            contents_hash, 
+            [], 
+            trigger) })
+        write_side_file(filename, '.index', {
+            'last': timestamp,
+            'added': { token : [timestamp] for token in set(TOKEN_PATTERN.findall(contents)) },
+            'removed': {}
+            })
+        write_side_file(filename, '.blame', {
+            'last': timestamp,
+            'lines': encode_blame([timestamp] * count_lines(contents))
+            })
+        record_identity(filename)
+        append_timeline(folder, filename, timestamp, len(contents), 0)
+    else:
+        previous_timestamp = max(int(i) for i in file_history.keys())
+        metadata = read_side_file(filename, '.meta') or {}
+        head_metadata = metadata.get(str(previous_timestamp))
+        if head_metadata and head_metadata['hash'] == contents_hash:
+            return # unchanged; no need to replay the history
+        latest_history = head(filename, file_history)
+        if contents != latest_history:
+            timestamp = int(time.time())
+            patch_group, file_history[timestamp] = snapshot_patches(
+                dmp, filename, latest_history, contents, 'snapshot')
+            write_history(filename, file_history)
+            if filename in state_checkpoints:
+                cache_state(state_checkpoints[filename], timestamp, contents)
+            metadata[timestamp] = snapshot_metadata(
+                contents, 
+                contents_hash, 
+                patch_group, 
+                trigger)
+            write_side_file(filename, '.meta', metadata)
+            token_index = read_side_file(filename, '.index')
+            if token_index and token_index['last'] == previous_timestamp:
+                index_tokens(
+                    token_index, 
+                    timestamp, 
+                    *changed_tokens(patch_group, latest_history, contents))
+                write_side_file(filename, '.index', token_index)
+            blame = read_side_file(filename, '.blame')
+            if blame and blame['last'] == previous_timestamp:
+                origins = update_blame(
+                    decode_blame(blame['lines']), 
+                    latest_history, 
+                    contents, 
+                    timestamp)
+                if origins is not None:
+                    write_side_file(filename, '.blame', {
+                        'last': timestamp,
+                        'lines': encode_blame(origins)
+                        })
+            append_timeline(
+                folder, 
+                filename, 
+                timestamp,
+                metadata[timestamp]['inserted'],
+                metadata[timestamp]['deleted'])
+
+def build_history_patches_with_deletions(filename, tracked_positions):
+    history = get_history(filename)
+    if not history:
+        return {}
+    return dict(iter_history_patches(
+        history,
+        apply_patches(history),
+        tracked_positions))
+
+def iter_history_patches(history, head, tracked_positions, timestamps=None):
+    """
+    Yield (timestamp, patch_change) newest first, walking
+    backwards from the head state so the most recent
+    snapshots are available without replaying from the origin.
+    tracked_positions are (a, b) regions in the head state; each
+    patch_change carries them mapped into its display text.
+    """
+    dmp = patcher()
+    if timestamps is None:
+        timestamps = history_timestamps(history)
+    state = head
+
+    for index in range(len(timestamps)-1, -1, -1):
+        timestamp = str(timestamps[index])
+        if index == 0: # first entry
+            yield timestamp, {
+                'added_ranges': [(0, len(state))],
+                'deleted_ranges' : [],
+                'display' : state,
+                'positions': tracked_positions
+            }
+            return
+
+        patch_group = dmp.patch_fromText(history[timestamp], frozen=True)
+        patch_change, state, position_map = unapply_patch_group(patch_group, state)
+        patch_change['positions'] = [
+            (position_map.to_display(a), position_map.to_display(b))
+            for a, b in tracked_positions]
+        tracked_positions = [
+            (position_map.to_previous(a), position_map.to_previous(b))
+            for a, b in tracked_positions]
+        yield timestamp, patch_change
+
+def unapply_patch_group(patch_group, state):
+    """
+    Given the state after a patch group was applied, return the
+    display/range record for it, the state before it and the
+    PositionMap between the two.
+    Hunk contexts can overlap, so only the changed spans are 
+    located, as offsets into the patched state.
+    """
+    display = []
+    previous = []
+    added_ranges = []
+    deleted_ranges = []
+    position_map = PositionMap()
+    position = 0
+    display_length = 0
+    for patch in patch_group:
+        change_position = patch.start2
+        for diff_type, diff_text in patch.diffs:
+            if diff_type == 0:
+                change_position += len(diff_text)
+                continue
+            unchanged = state[position:change_position]
+            display.append(unchanged)
+            previous.append(unchanged)
+            display_length += len(unchanged)
+            length = len(diff_text)
+            display.append(diff_text)
+            if diff_type == 1:
+                added_ranges.append((display_length, display_length + length))
+                position_map.add_insertion(change_position, length)
+                change_position += length
+            else:
+                deleted_ranges.append((display_length, display_length + length))
+                position_map.add_deletion(change_position, length)
+                previous.append(diff_text)
+            display_length += length
+            position = change_position
+    display.append(state[position:])
+    previous.append(state[position:])
+    return {
+        'added_ranges' : added_ranges,
+        'deleted_ranges' : deleted_ranges,
+        'display' : ''.join(display)
+    }, ''.join(previous), position_map
+
+class PositionMap:
+    """
+    Maps offsets in the state after one snapshot's patch group
+    back to the state before it, and into its display text.
+    Edits are kept as sorted offsets with cumulative deltas 
+    (previous minus new), so each lookup is a bisect.
+    """
+    __slots__ = (
+        'new_starts', 'new_ends', 'old_starts', 'deltas', 
+        'deleted_offsets', 'deleted_totals')
+
+    def __init__(self):
+        self.new_starts = []
+        self.new_ends = []
+        self.old_starts = []
+        self.deltas = []
+        self.deleted_offsets = []
+        self.deleted_totals = []
+
+    def add_insertion(self, offset, length):
+        delta = self.deltas[-1] if self.deltas else 0
+        self.new_starts.append(offset)
+        self.new_ends.append(offset + length)
+        self.old_starts.append(offset + delta)
+        self.deltas.append(delta - length)
+
+    def add_deletion(self, offset, length):
+        delta = self.deltas[-1] if self.deltas else 0
+        self.new_starts.append(offset)
+        self.new_ends.append(offset)
+        self.old_starts.append(offset + delta)
+        self.deltas.append(delta + length)
+        total = self.deleted_totals[-1] if self.deleted_totals else 0
+        self.deleted_offsets.append(offset)
+        self.deleted_totals.append(total + length)
+
+    def to_previous(self, offset):
+        index = bisect.bisect_right(self.new_starts, offset) - 1
+        if index < 0:
+            return offset
+        if offset < self.new_ends[index]: # inside inserted text
+            return self.old_starts[index]
+        return offset + self.deltas[index]
+
+    def to_display(self, offset):
+        """
+        Map an offset in the new state into the display text,
+        which has the deleted spans put back in.
+        """
+        index = bisect.bisect_right(self.deleted_offsets, offset) - 1
+        if index < 0:
+            return offset
+        return offset + self.deleted_totals[index]
+
+def apply_patches(history):
+    dmp = patcher()
+    timestamps = sorted(history.keys())
+    original = history[timestamps[0]]
+    for index in range(1,len(timestamps)):
+        next_patch = history[timestamps[index]]
+        original = dmp.patch_apply(dmp.patch_fromText(next_patch, frozen=True), original)[0]
+    return original
+
+def state_at(filename, timestamp, history=None):
+    """
+    The file as it was at timestamp (the latest snapshot at or
+    before it).
+    """
+    if history is None:
+        history = get_history(filename)
+    timestamps = history_timestamps(history)
+    index = bisect.bisect_right(timestamps, int(timestamp)) - 1
+    if index < 0:
+        raise ValueError('No snapshot of %s at %s' % (filename, timestamp))
+    return state_at_index(filename, history, timestamps, index)
+
+def head(filename, history=None):
+    """
+    The newest recorded state of the file.
+    """
+    if history is None:
+        history = get_history(filename)
+    timestamps = history_timestamps(history)
+    return state_at_index(filename, history, timestamps, len(timestamps) - 1)
+
+def state_at_index(filename, history, timestamps, index):
+    """
+    Reconstruct the state at timestamps[index] by replaying
+    forward from the nearest cached checkpoint rather than 
+    from the origin. Histories are append-only, so checkpoints
+    stay valid while the origin timestamp is unchanged.
+    """
+    origin = timestamps[0]
+    cached = state_checkpoints.get(filename)
+    if not cached or cached[0] != origin:
+        cached = [origin, { origin : history[str(origin)] }, None]
+        state_checkpoints[filename] = cached
+    checkpoints = cached[1]
+    interval = max(CHECKPOINT_INTERVAL, len(timestamps) // MAX_CHECKPOINTS)
+
+    start = index
+    while timestamps[start] not in checkpoints:
+        start -= 1
+    replayed = range(start + 1, index + 1)
+    replay_args = (
+        checkpoints[timestamps[start]],
+        [history[str(timestamps[i])] for i in replayed],
+        [i % interval == 0 for i in replayed])
+    if len(replayed) >= WORKER_MIN_REPLAY:
+        kept, state = in_workers(replay, *replay_args)
+    else:
+        kept, state = replay(*replay_args)
+    for replay_index, kept_state in zip(
+            [i for i in replayed if i % interval == 0], kept):
+        checkpoints[timestamps[replay_index]] = kept_state
+        if cached[2] == timestamps[replay_index]:
+            cached[2] = None
+    cache_state(cached, timestamps[index], state)
+    if len(checkpoints) > MAX_CHECKPOINTS + 2:
+        # the interval has grown with the history; drop the
+        # checkpoints that are off it now
+        for timestamp in list(checkpoints):
+            position = bisect.bisect_left(timestamps, timestamp)
+            if position % interval and timestamp != cached[2]:
+                del checkpoints[timestamp]
+    return state
+
+def cache_state(cached, timestamp, state):
+    """
+    Keep state as the one checkpoint off the interval, usually
+    the head, in place of the one kept before.
+    """
+    checkpoints = cached[1]
+    if timestamp in checkpoints:
+        return
+    if cached[2] is not None:
+        del checkpoints[cached[2]]
+    checkpoints[timestamp] = state
+    cached[2] = timestamp
+
+def replay(state, patch_texts, keep):
+    """
+    Apply the patch texts to state in turn. Returns the states
+    after each one flagged in keep, and the final state.
+    """
+    dmp = patcher()
+    kept = []
+    for patch_text, keep_state in zip(patch_texts, keep):
+        state = dmp.patch_apply(dmp.patch_fromText(patch_text, frozen=True), state)[0]
+        if keep_state:
+            kept.append(state)
+    return kept, state
+
+def iter_region_history(history, head, region, timestamps=None):
+    """
+    Yield (timestamp, text) newest first for each snapshot that
+    changed region (a, b) of the head, mapping the region back 
+    through time. Snapshots whose hunk headers miss the region
+    are skipped without parsing their patches.
+    """
+    dmp = patcher()
+    if timestamps is None:
+        timestamps = history_timestamps(history)
+    start, end = region
+    text = head[start:end]
+
+    for index in range(len(timestamps)-1, 0, -1):
+        timestamp = str(timestamps[index])
+        patch_text = history[timestamp]
+        shift = 0
+        touched = False
+        for hunk_start, length1, length2 in patch_hunk_spans(patch_text):
+            if hunk_start + length2 <= start:
+                shift += length1 - length2
+            elif hunk_start < end or (hunk_start == end and start == end):
+                touched = True
+                break
+        if not touched:
+            start += shift
+            end += shift
+            continue
+
+        position_map = PositionMap()
+        previous_text = []
+        position = start
+        for patch in dmp.patch_fromText(patch_text, frozen=True):
+            change_position = patch.start2
+            for diff_type, diff_text in patch.diffs:
+                length = len(diff_text)
+                if diff_type == 0:
+                    change_position += length
+                    continue
+                if diff_type == 1:
+                    position_map.add_insertion(change_position, length)
+                    if change_position < end and change_position + length > start:
+                        previous_text.append(head_slice(text, start, position, change_position))
+                        position = min(change_position + length, end)
+                    change_position += length
+                else:
+                    position_map.add_deletion(change_position, length)
+                    if start < change_position < end:
+                        previous_text.append(head_slice(text, start, position, change_position))
+                        previous_text.append(diff_text)
+                        position = change_position
+        previous_text.append(text[position - start:])
+        previous_text = ''.join(previous_text)
+        if previous_text != text:
+            yield timestamp, text
+        start = position_map.to_previous(start)
+        end = start + len(previous_text)
+        text = previous_text
+
+    if text:
+        yield str(timestamps[0]), text
+
+def head_slice(text, offset, start, end):
+    return text[max(start - offset, 0):max(end - offset, 0)]
+
+def patch_hunk_spans(patch_text):
+    """
+    (start2, length1, length2) of each hunk, read from the 
+    headers only, as patch_fromText would parse them.
+    """
+    spans = []
+    for match in HUNK_HEADER.finditer(patch_text):
+        spans.append((
+            int(match.group(3)) - (0 if match.group(4) == '0' else 1),
+            int(match.group(2) or 1),
+            int(match.group(4) or 1)))
+    return spans
+
+def changes_between(filename, from_timestamp, to_timestamp, history=None):
+    """
+    Diff between the file at any two timestamps, cached for 
+    repeat comparisons.
+    """
+    if history is None:
+        history = get_history(filename)
+    timestamps = history_timestamps(history)
+    from_index = bisect.bisect_right(timestamps, int(from_timestamp)) - 1
+    to_index = bisect.bisect_right(timestamps, int(to_timestamp)) - 1
+    key = (filename, timestamps[from_index], timestamps[to_index])
+    if key in comparison_cache:
+        comparison_cache.move_to_end(key)
+        return comparison_cache[key]
+    diffs, stats = in_workers(
+        compare_states,
+        filename,
+        state_at_index(filename, history, timestamps, from_index),
+        state_at_index(filename, history, timestamps, to_index))
+    diff_stats['compare'].update(stats)
+    comparison_cache[key] = diffs
+    if len(comparison_cache) > COMPARISON_CACHE_SIZE:
+        comparison_cache.popitem(last=False)
+    return diffs
+
+def compare_states(filename, old, new):
+    """
+    Cleaned-up diffs from old to new within the comparison
+    budget, with the diff_stats they added.
+    """
+    dmp = differ(filename)
+    dmp.Diff_Timeout = diff_budget('compare', len(old) + len(new))
+    diffs = dmp.diff_main(old, new)
+    dmp.diff_cleanupSemantic(diffs)
+    return diffs, { 'diffs': 1, 'timeouts': int(dmp.Diff_TimedOut) }
+
+def compact(filename, keep_after, interval, dry_run=False):
+    """
+    Thin snapshots older than keep_after to the last one in 
+    each interval seconds, keeping the origin and everything
+    newer. The history is rewritten once, streaming through 
+    its states. Returns the (before, after) record counts.
+    """
+    history = get_history(filename)
+    if not history:
+        return 0, 0
+    timestamps = history_timestamps(history)
+    kept = set()
+    for index, timestamp in enumerate(timestamps):
+        if index == 0 or index == len(timestamps) - 1 or timestamp >= keep_after:
+            kept.add(timestamp)
+            continue
+        next_timestamp = timestamps[index + 1]
+        if next_timestamp >= keep_after or next_timestamp // interval != timestamp // interval:
+            kept.add(timestamp) # last in its interval
+    if dry_run or len(kept) == len(timestamps):
+        return len(timestamps), len(kept)
+
+    dmp = differ(filename)
+    metadata = read_side_file(filename, '.meta') or {}
+    records = {}
+    kept_metadata = {}
+    kept_state = None
+    for timestamp, state in iter_history_states(filename):
+        if timestamp not in kept:
+            continue
+        if kept_state is None:
+            records[str(timestamp)] = state
+            patch_group = []
+        else:
+            patch_group, records[str(timestamp)] = snapshot_patches(
+                dmp, filename, kept_state, state, 'rewrite')
+        kept_metadata[str(timestamp)] = snapshot_metadata(
+            state, 
+            content_hash(state), 
+            patch_group, 
+            (metadata.get(str(timestamp)) or {}).get('trigger'))
+        kept_state = state
+    write_history(filename, records)
+    write_side_file(filename, '.meta', kept_metadata)
+    history_rewritten(filename)
+    return len(timestamps), len(kept)
+
+def verify(filename):
+    """
+    Replay the whole history, streaming, and return a list of
+    problems: hunks that didn't apply cleanly and states that 
+    don't match their recorded hash.
+    """
+    dmp = patcher()
+    metadata = read_side_file(filename, '.meta') or {}
+    problems = []
+    state = None
+    try:
+        for timestamp, record in iter_history_records(filename):
+            if state is None:
+                state = record
+            else:
+                state, results = dmp.patch_apply(dmp.patch_fromText(record, frozen=True), state)
+                if not all(results):
+                    problems.append('%s: %d of %d hunks failed' % (
+                        timestamp, results.count(False), len(results)))
+            recorded = metadata.get(timestamp)
+            if recorded and recorded['hash'] != content_hash(state):
+                problems.append('%s: content hash mismatch' % timestamp)
+    except ValueError as e:
+        problems.append(str(e))
+    return problems
+
+def rebuild_side_files(filename):
+    """
+    Regenerate the token index and blame from the history, and
+    fill in metadata missing for any snapshot. Metadata that is
+    there is kept, as its triggers can't be derived again.
+    """
+    for extension in ('.index', '.blame'):
+        if os.path.exists(side_file(filename, extension)):
+            os.remove(side_file(filename, extension))
+    try:
+        read_side_file(filename, '.meta')
+    except ValueError: # unreadable, so there's nothing to keep
+        os.remove(side_file(filename, '.meta'))
+    history = get_history(filename)
+    if history:
+        get_metadata(filename, history)
+        get_token_index(filename, history)
+        get_blame(filename, history)
+
+def history_rewritten(filename):
+    """
+    Drop derived data that assumed the old records; the index
+    and blame are rebuilt on next use.
+    """
+    for extension in ('.index', '.blame'):
+        if os.path.exists(side_file(filename, extension)):
+            os.remove(side_file(filename, extension))
+    state_checkpoints.pop(filename, None)
+    for key in [key for key in comparison_cache if key[0] == filename]:
+        del comparison_cache[key]
+
+def diffs_to_display(diffs):
+    """
+    Lay out a diff as the new text with deletions put back in,
+    returning it with the added and deleted ranges.
+    """
+    display = []
+    added_ranges = []
+    deleted_ranges = []
+    display_length = 0
+    for diff_type, diff_text in diffs:
+        length = len(diff_text)
+        if diff_type == 1:
+            added_ranges.append((display_length, display_length + length))
+        elif diff_type == -1:
+            deleted_ranges.append((display_length, display_length + length))
+        display.append(diff_text)
+        display_length += length
+    return ''.join(display), added_ranges, deleted_ranges
+
+def history_timestamps(history):
+    """
+    Timestamps of a history as one ascending integer array.
+    """
+    return array.array('q', sorted(int(i) for i in history.keys()))
+
+def group_timestamps(timestamps, start, end, boundary):
+    """
+    Split timestamps[start:end] into (start, end) index ranges,
+    newest first, that share the same boundary(). Costs one 
+    boundary() call and one bisect per group.
+    """
+    groups = []
+    index = end - 1
+    while index >= start:
+        group_start = bisect.bisect_left(
+            timestamps, 
+            boundary(timestamps[index]), 
+            start, 
+            index)
+        groups.append((group_start, index + 1))
+        index = group_start - 1
+    return groups
+
+def day_start(timestamp):
+    return int(datetime.datetime.fromtimestamp(timestamp).replace(
+        hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+def hour_start(timestamp):
+    return int(datetime.datetime.fromtimestamp(timestamp).replace(
+        minute=0, second=0, microsecond=0).timestamp())
+
+def changed_tokens(patch_group, old, new):
+    """
+    Tokens a patch group introduced and removed, counted over
+    the whole lines around each change so split words are 
+    seen whole and moved tokens cancel out.
+    """
+    old_spans = []
+    new_spans = []
+    delta = 0
+    for patch in patch_group:
+        change_position = patch.start2
+        for diff_type, diff_text in patch.diffs:
+            length = len(diff_text)
+            if diff_type == 0:
+                change_position += length
+            elif diff_type == 1:
+                new_spans.append((change_position, change_position + length))
+                old_spans.append((change_position + delta, change_position + delta))
+                delta -= length
+                change_position += length
+            else:
+                new_spans.append((change_position, change_position))
+                old_spans.append((change_position + delta, change_position + delta + length))
+                delta += length
+    new_tokens = count_line_tokens(new, new_spans)
+    old_tokens = count_line_tokens(old, old_spans)
+    return set(new_tokens - old_tokens), set(old_tokens - new_tokens)
+
+def count_line_tokens(text, spans):
+    counts = collections.Counter()
+    counted_to = 0
+    for start, end in spans:
+        start = max(text.rfind('\n', 0, start) + 1, counted_to)
+        end = text.find('\n', end)
+        if end == -1:
+            end = len(text)
+        if end < start:
+            continue
+        counts.update(TOKEN_PATTERN.findall(text, start, end))
+        counted_to = end
+    return counts
+
+def index_tokens(token_index, timestamp, added, removed):
+    for token in added:
+        token_index['added'].setdefault(token, []).append(timestamp)
+    for token in removed:
+        token_index['removed'].setdefault(token, []).append(timestamp)
+    token_index['last'] = timestamp
+
+def get_token_index(filename, history):
+    """
+    Read the token index, rebuilding it from the history if
+    it is missing or behind (e.g. history from before indexing).
+    """
+    timestamps = history_timestamps(history)
+    token_index = read_side_file(filename, '.index')
+    if token_index and token_index['last'] == timestamps[-1]:
+        return token_index
+
+    dmp = patcher()
+    state = history[str(timestamps[0])]
+    token_index = {
+        'last': timestamps[0],
+        'added': { token : [timestamps[0]] for token in set(TOKEN_PATTERN.findall(state)) },
+        'removed': {}
+        }
+    for timestamp in timestamps[1:]:
+        patch_group = dmp.patch_fromText(history[str(timestamp)], frozen=True)
+        new_state = dmp.patch_apply(patch_group, state)[0]
+        index_tokens(
+            token_index, 
+            timestamp, 
+            *changed_tokens(patch_group, state, new_state))
+        state = new_state
+    write_side_file(filename, '.index', token_index)
+    return token_index
+
+def file_identity(path):
+    """
+    (device, inode) of a file, which survives renames and moves
+    within a filesystem.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_dev, stat.st_ino]
+
+def disk_state(path):
+    """
+    Identity plus the mtime and size, to tell when the file
+    was changed on disk since the history last saw it.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {
+        'identity': [stat.st_dev, stat.st_ino],
+        'mtime': stat.st_mtime,
+        'size': stat.st_size
+        }
+
+def record_identity(filename):
+    state = disk_state(filename)
+    if state and read_side_file(filename, '.identity') != state:
+        write_side_file(filename, '.identity', state)
+    disk_states[filename] = state
+
+def record_disk_changes(filename, folder=None, trigger=None):
+    """
+    Record the file as it is on disk if its mtime or size 
+    differ from what the history last saw, e.g. after a 
+    checkout or a formatter. Costs a stat when nothing changed.
+    """
+    if not os.path.exists(side_file(filename, '.diff')):
+        return False
+    current = disk_state(filename)
+    if not current:
+        return False
+    if filename not in disk_states:
+        disk_states[filename] = read_side_file(filename, '.identity')
+    seen = disk_states[filename]
+    if seen and (seen['mtime'], seen['size']) == (current['mtime'], current['size']):
+        return False
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            contents = f.read()
+    except (OSError, UnicodeDecodeError):
+        return False
+    record(filename, contents, folder, trigger)
+    record_identity(filename)
+    return True
+
+def relocate_histories(moves):
+    """
+    Move the history and side files for each (old, new) path pair
+    in one pass, creating each target _diff directory once.
+    Existing histories at the new path are never overwritten.
+    """
+    created = set()
+    for old_name, new_name in moves:
+        if os.path.exists(side_file(new_name, '.diff')):
+            continue
+        target = os.path.join(os.path.dirname(new_name), '_diff')
+        if target not in created and not os.path.exists(target):
+            os.mkdir(target)
+        created.add(target)
+        for extension in HISTORY_EXTENSIONS:
+            if os.path.exists(side_file(old_name, extension)):
+                os.rename(
+                    side_file(old_name, extension), 
+                    side_file(new_name, extension))
+        record_identity(new_name)
+        state_checkpoints.pop(old_name, None)
+
+def reconcile_histories(folders):
+    """
+    Re-link orphaned histories (whose file no longer exists) by
+    walking the folders once: first by inode, then by the head
+    hash for files that were copied or rewritten.
+    """
+    orphans = []
+    by_identity = {}
+    unhistoried = []
+    for folder in folders:
+        for dirpath, dirnames, filenames in os.walk(folder):
+            if '_diff' in dirnames:
+                dirnames.remove('_diff')
+                for name in os.listdir(os.path.join(dirpath, '_diff')):
+                    if name.endswith('.diff'):
+                        source = os.path.join(dirpath, name[:-len('.diff')])
+                        if not os.path.exists(source):
+                            orphans.append(source)
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                state = disk_state(path)
+                if state:
+                    by_identity[tuple(state['identity'])] = (path, state)
+                if not os.path.exists(side_file(path, '.diff')):
+                    unhistoried.append(path)
+    if not orphans:
+        return []
+
+    moves = []
+    unmatched = []
+    for orphan in orphans:
+        seen = read_side_file(orphan, '.identity')
+        found = seen and by_identity.get(tuple(seen['identity']))
+        # inodes are reused after a delete, so the file must also
+        # be as the history last saw it, or hold its head
+        if found and (
+                (found[1]['size'], found[1]['mtime']) == (seen.get('size'), seen.get('mtime'))
+                or holds_head(found[0], orphan)):
+            moves.append((orphan, found[0]))
+        else:
+            unmatched.append(orphan)
+
+    moved_to = set(new_name for old_name, new_name in moves)
+    by_hash = {}
+    for orphan in unmatched:
+        head = head_metadata(orphan)
+        if head:
+            by_hash[head['hash']] = (orphan, head['length'])
+    if by_hash:
+        lengths = set(length for orphan, length in by_hash.values())
+        for path in unhistoried:
+            if path in moved_to:
+                continue
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if not any(length <= size <= 4 * length for length in lengths):
+                continue
+            match = by_hash.pop(file_hash(path), None)
+            if match:
+                moves.append((match[0], path))
+    relocate_histories(moves)
+    return moves
+
+def head_metadata(filename):
+    """
+    The metadata of the newest snapshot in filename's history.
+    """
+    history = get_history(filename)
+    metadata = read_side_file(filename, '.meta')
+    if not history or not metadata:
+        return None
+    return metadata.get(str(history_timestamps(history)[-1]))
+
+def holds_head(path, filename):
+    """
+    Whether the file at path is the newest snapshot of filename.
+    """
+    head = head_metadata(filename)
+    return bool(head) and file_hash(path) == head['hash']
+
+def file_hash(path):
+    """
+    content_hash of the file on disk, or None if unreadable.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return content_hash(f.read())
+    except (OSError, UnicodeDecodeError):
+        return None
+
+def git_tracked_files(folder):
+    try:
+        output = subprocess.check_output(
+            ['git', 'ls-files', '-z'], 
+            cwd=folder, 
+            stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    return [
+        os.path.join(folder, path) 
+        for path in output.decode('utf-8').split('\0') if path and '_diff/' not in path
+        ]
+
+def git_file_versions(filename):
+    """
+    (commit time, commit, text) for each version of filename in 
+    git log --follow, oldest first; commits in the same second
+    keep their log order. All blobs are read through one git 
+    cat-file --batch process.
+    """
+    directory = os.path.dirname(filename)
+    try:
+        log = subprocess.check_output(
+            ['git', 'log', '--follow', '--format=%x00%H %ct', '--name-only', 
+             '--', os.path.basename(filename)],
+            cwd=directory,
+            stderr=subprocess.DEVNULL).decode('utf-8')
+        root = subprocess.check_output(
+            ['git', 'rev-parse', '--show-toplevel'],
+            cwd=directory,
+            stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return []
+
+    commits = []
+    for entry in log.split('\0')[1:]:
+        lines = [line for line in entry.split('\n') if line]
+        if len(lines) < 2:
+            continue
+        commit, commit_time = lines[0].split()
+        commits.append((int(commit_time), commit, lines[1]))
+    if not commits:
+        return []
+
+    request = ''.join('%s:%s\n' % (commit, path) for t, commit, path in commits)
+    process = subprocess.Popen(
+        ['git', 'cat-file', '--batch'],
+        cwd=root,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL)
+    output = process.communicate(request.encode('utf-8'))[0]
+
+    versions = []
+    position = 0
+    for commit_time, commit, path in commits:
+        header_end = output.index(b'\n', position)
+        header = output[position:header_end].split()
+        position = header_end + 1
+        if len(header) < 3 or header[1] != b'blob':
+            continue
+        size = int(header[2])
+        blob = output[position:position + size]
+        position += size + 1
+        try:
+            text = blob.decode('utf-8').replace('\r\n', '\n')
+        except UnicodeDecodeError:
+            continue
+        versions.append((commit_time, commit, text))
+    versions.reverse() # log order is newest first
+    versions.sort(key=lambda version: version[0])
+    return versions
+
+def import_git_history(filename):
+    """
+    Prepend the file's git versions older than its history to
+    the history, writing the history and metadata once. Index
+    and blame files are dropped to be rebuilt on next use.
+    Returns the number of records imported.
+    """
+    dmp = differ(filename)
+    history = get_history(filename) or {}
+    timestamps = history_timestamps(history) if history else []
+    versions = git_file_versions(filename)
+    if timestamps:
+        versions = [v for v in versions if v[0] < timestamps[0]]
+    # records are keyed by the second, so of commits made in the
+    # same second (as a rebase makes them) only the last is kept
+    versions = [v for v, next_version in zip(versions, versions[1:] + [None])
+                if next_version is None or next_version[0] != v[0]]
+    if not versions:
+        return 0
+
+    records = {}
+    metadata = read_side_file(filename, '.meta') or {}
+    state = None
+    for commit_time, commit, text in versions:
+        trigger = { 'event': 'git_import', 'commit': commit }
+        if state is None:
+            records[str(commit_time)] = text
+            metadata[str(commit_time)] = snapshot_metadata(text, content_hash(text), [], trigger)
+        elif text != state:
+            patch_group, records[str(commit_time)] = snapshot_patches(
+                dmp, filename, state, text, 'rewrite')
+            metadata[str(commit_time)] = snapshot_metadata(
+                text, content_hash(text), patch_group, trigger)
+        state = text
+    if timestamps:
+        # the old origin becomes a patch from the newest git version
+        origin = history[str(timestamps[0])]
+        patch_group, history[str(timestamps[0])] = snapshot_patches(
+            dmp, filename, state, origin, 'rewrite')
+        metadata[str(timestamps[0])] = snapshot_metadata(
+            origin, 
+            content_hash(origin), 
+            patch_group, 
+            (metadata.get(str(timestamps[0])) or {}).get('trigger'))
+    records.update(history)
+
+    write_history(filename, records)
+    write_side_file(filename, '.meta', metadata)
+    history_rewritten(filename)
+    if not timestamps:
+        record_identity(filename)
+    return len(versions)
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def snapshot_metadata(state, state_hash, patch_group, trigger):
+    """
+    Small per-snapshot record kept in _diff/<name>.meta, so 
+    labels and statistics don't need to rebuild any state.
+    """
+    if patch_group:
+        inserted = sum(len(text) for patch in patch_group for op, text in patch.diffs if op == 1)
+        deleted = sum(len(text) for patch in patch_group for op, text in patch.diffs if op == -1)
+    else: # origin
+        inserted = len(state)
+        deleted = 0
+    return {
+        'length': len(state),
+        'inserted': inserted,
+        'deleted': deleted,
+        'hunks': len(patch_group),
+        'hash': state_hash,
+        'trigger': trigger
+        }
+
+def get_metadata(filename, history):
+    """
+    Metadata for every snapshot, filling in records missing 
+    from histories written before metadata was kept.
+    """
+    timestamps = history_timestamps(history)
+    metadata = read_side_file(filename, '.meta') or {}
+    if all(str(i) in metadata for i in timestamps):
+        return metadata
+
+    dmp = patcher()
+    state = None
+    for timestamp in timestamps:
+        if state is None:
+            state = history[str(timestamp)]
+            patch_group = []
+        else:
+            patch_group = dmp.patch_fromText(history[str(timestamp)], frozen=True)
+            state = dmp.patch_apply(patch_group, state)[0]
+        if str(timestamp) not in metadata:
+            metadata[str(timestamp)] = snapshot_metadata(
+                state, 
+                content_hash(state), 
+                patch_group, 
+                None)
+    write_side_file(filename, '.meta', metadata)
+    return metadata
+
+def timeline_file(folder):
+    return os.path.join(folder, '_diff', '_timeline.jsonl')
+
+def append_timeline(folder, filename, timestamp, added, removed):
+    """
+    Append one line per snapshot to the project timeline, so
+    recent changes can be listed without reading any history.
+    """
+    if not folder:
+        return
+    if not os.path.exists(os.path.join(folder, '_diff')):
+        os.mkdir(os.path.join(folder, '_diff'))
+    with open(timeline_file(folder), "a") as f:
+        f.write(json.dumps({
+            'file': os.path.relpath(filename, folder),
+            'timestamp': timestamp,
+            'added': added,
+            'removed': removed
+            }) + '\n')
+
+def read_timeline(folder, limit):
+    """
+    The last limit timeline entries, read backwards from the 
+    end of the file in blocks.
+    """
+    path = timeline_file(folder)
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        while position > 0 and data.count(b'\n') <= limit:
+            read_size = min(TIMELINE_BLOCK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.decode('utf-8').split('\n')
+    if position > 0:
+        lines = lines[1:] # partial first line
+    return [json.loads(line) for line in lines[-limit - 1:] if line.strip()][-limit:]
+
+def count_lines(text):
+    return text.count('\n') + (0 if not text or text.endswith('\n') else 1)
+
+def update_blame(origins, old, new, timestamp, kind='snapshot'):
+    """
+    Carry line origins from old to new with a line-level diff
+    within the diff budget for kind; inserted or rewritten lines
+    are stamped with timestamp. Returns None if origins doesn't 
+    describe old.
+    """
+    dmp = patcher()
+    ids1, ids2, _, _ = dmp.diff_linesToInts(old, new)
+    if len(ids1) != len(origins) or len(ids2) != count_lines(new):
+        return None
+    dmp.Diff_Timeout = diff_budget(kind, len(old) + len(new))
+    runs = dmp.diff_lineIds(ids1, ids2)
+    # counted apart from kind, whose diffs make_patches counts
+    stats = diff_stats['blame']
+    stats['diffs'] += 1
+    if dmp.Diff_TimedOut: # the rest of the lines count as rewritten
+        stats['timeouts'] += 1
+    new_origins = []
+    position = 0
+    for diff_type, length in runs:
+        if diff_type == 0:
+            new_origins.extend(origins[position:position + length])
+            position += length
+        elif diff_type == -1:
+            position += length
+        else:
+            new_origins.extend([timestamp] * length)
+    return new_origins
+
+def encode_blame(origins):
+    """
+    Run-length encode line origins as [timestamp, count] pairs.
+    """
+    runs = []
+    for timestamp in origins:
+        if runs and runs[-1][0] == timestamp:
+            runs[-1][1] += 1
+        else:
+            runs.append([timestamp, 1])
+    return runs
+
+def decode_blame(runs):
+    origins = []
+    for timestamp, count in runs:
+        origins.extend([timestamp] * count)
+    return origins
+
+def get_blame(filename, history):
+    """
+    Line origins of the head, from the blame file kept up to date 
+    by record(), or rebuilt once from the history if stale.
+    """
+    timestamps = history_timestamps(history)
+    blame = read_side_file(filename, '.blame')
+    if blame and blame['last'] == timestamps[-1]:
+        return decode_blame(blame['lines'])
+
+    dmp = patcher()
+    state = history[str(timestamps[0])]
+    origins = [timestamps[0]] * count_lines(state)
+    for timestamp in timestamps[1:]:
+        new_state = dmp.patch_apply(
+            dmp.patch_fromText(history[str(timestamp)], frozen=True), 
+            state)[0]
+        origins = update_blame(origins, state, new_state, timestamp, 'rewrite')
+        if origins is None: # line table overflow; start this file over
+            origins = [timestamp] * count_lines(new_state)
+        state = new_state
+    write_side_file(filename, '.blame', {
+        'last': timestamps[-1],
+        'lines': encode_blame(origins)
+        })
+    return origins
+
+def side_file(filename, extension):
+    """
+    Path of a file kept next to the history, e.g. '.index'.
+    """
+    return os.path.join(
+        os.path.dirname(filename), 
+        '_diff', 
+        os.path.basename(filename) + extension)
+
+def read_side_file(filename, extension):
+    path = side_file(filename, extension)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.loads(f.read())
+
+def write_side_file(filename, extension, data):
+    with open(side_file(filename, extension), "w") as f:
+        f.write(json.dumps(data))
+
+def iter_history_records(filename):
+    """
+    Yield (timestamp, record) from a history file in file order,
+    decoding the JSON incrementally so only one record is held
+    in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    with open(side_file(filename, '.diff'), "r") as f:
+        buffer = ''
+        position = 0
+        read_size = EXPORT_READ_SIZE
+        expect = '{'
+        key = None
+        at_end = False
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position == len(buffer) or (expect in ('key', 'value') and 
+                    buffer[position] == '"' and not at_end and 
+                    buffer.find('"', position + 1) == -1):
+                if at_end:
+                    return
+                chunk = f.read(read_size)
+                at_end = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            character = buffer[position]
+            if expect == '{':
+                if character != '{':
+                    raise ValueError('Invalid history file: ' + filename)
+                position += 1
+                expect = 'key'
+            elif expect in ('key', 'value'):
+                if expect == 'key' and character == '}':
+                    return
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    if at_end:
+                        raise
+                    # record continues past the buffer; read more
+                    chunk = f.read(read_size)
+                    at_end = not chunk
+                    read_size *= 2
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                    continue
+                position = end
+                if expect == 'key':
+                    key = value
+                    expect = ':'
+                else:
+                    yield key, value
+                    expect = ','
+            elif expect == ':':
+                position += 1
+                expect = 'value'
+            elif expect == ',':
+                if character == '}':
+                    return
+                position += 1
+                expect = 'key'
+
+def iter_history_states(filename):
+    """
+    Yield (timestamp, state) oldest first, holding only the
+    current state and one patch.
+    """
+    dmp = patcher()
+    state = None
+    previous_timestamp = None
+    for timestamp, record in iter_history_records(filename):
+        timestamp = int(timestamp)
+        if previous_timestamp is not None and timestamp < previous_timestamp:
+            raise ValueError('History records out of order: ' + filename)
+        if state is None:
+            state = record
+        else:
+            state = dmp.patch_apply(dmp.patch_fromText(record, frozen=True), state)[0]
+        previous_timestamp = timestamp
+        yield timestamp, state
+
+def export_unified_diffs(filename, out):
+    """
+    Write the history to out as a series of unified diffs.
+    """
+    name = os.path.basename(filename)
+    previous = ''
+    previous_label = '/dev/null'
+    count = 0
+    for timestamp, state in iter_history_states(filename):
+        label = datetime.datetime.fromtimestamp(timestamp).strftime(TS_FORMAT)
+        for line in difflib.unified_diff(
+                previous.splitlines(True), 
+                state.splitlines(True),
+                'a/' + name if previous_label != '/dev/null' else previous_label,
+                'b/' + name,
+                previous_label,
+                label):
+            out.write(line)
+            if not line.endswith('\n'):
+                out.write('\n\\ No newline at end of file\n')
+        previous = state
+        previous_label = label
+        count += 1
+    return count
+
+def export_states(filename, timestamps, directory):
+    """
+    Write the full text at each of timestamps to directory as
+    <name>.<timestamp>.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    wanted = set(timestamps)
+    count = 0
+    for timestamp, state in iter_history_states(filename):
+        if timestamp in wanted:
+            with open(os.path.join(
+                    directory, 
+                    '%s.%d' % (os.path.basename(filename), timestamp)), "w", encoding="utf-8") as f:
+                f.write(state)
+            count += 1
+            wanted.discard(timestamp)
+            if not wanted:
+                break
+    return count
+
+def export_git(filename, directory):
+    """
+    Commit every snapshot to a new branch of a git repository
+    at directory, streamed through git fast-import.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    if not os.path.exists(os.path.join(directory, '.git')):
+        subprocess.check_call(['git', 'init', '-q'], cwd=directory)
+    name = os.path.basename(filename)
+    process = subprocess.Popen(
+        ['git', 'fast-import', '--quiet'],
+        cwd=directory,
+        stdin=subprocess.PIPE)
+    count = 0
+    for timestamp, state in iter_history_states(filename):
+        message = ('%s at %s\n' % (
+            name, 
+            datetime.datetime.fromtimestamp(timestamp).strftime(TS_FORMAT))).encode('utf-8')
+        data = state.encode('utf-8')
+        header = (
+            'commit refs/heads/%s\n'
+            'committer Diff History <diff-history@localhost> %d +0000\n'
+            'data %d\n' % (EXPORT_GIT_BRANCH, timestamp, len(message)))
+        process.stdin.write(b''.join([
+            header.encode('utf-8'), message,
+            ('M 644 inline %s\ndata %d\n' % (name, len(data))).encode('utf-8'),
+            data, b'\n']))
+        count += 1
+    process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError('git fast-import failed in ' + directory)
+    subprocess.call(
+        ['git', 'checkout', '-q', EXPORT_GIT_BRANCH], 
+        cwd=directory)
+    return count
+
+def write_history(filename, history):
+    if not os.path.exists(os.path.join(os.path.dirname(filename), '_diff')):
+        os.mkdir(os.path.join(os.path.dirname(filename), '_diff'))
+    history_file = side_file(filename, '.diff')
+    if os.path.exists(history_file):
+        os.remove(history_file) # might prevent duplicate files on cloud storage ?
+    with open(history_file, "w") as f:
+        f.write(json.dumps(history))
+
+def get_history(filename):
+    history_file = os.path.join(
+        os.path.dirname(filename), 
+        '_diff', 
+        os.path.basename(filename) + '.diff')
+    if os.path.exists(history_file):
+        with open(history_file, "r") as f:
+            file_history = f.read()
+        return json.loads(file_history)
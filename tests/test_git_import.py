@@ -0,0 +1,65 @@
+"""
+Importing git history into a file's _diff history.
+
+    python -m unittest discover tests
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_engine import history_engine as engine
+
+
+class GitImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'notes.txt')
+        self.git('init', '-q')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        engine.state_checkpoints.clear()
+
+    def git(self, *args, date=None):
+        env = dict(os.environ,
+            GIT_AUTHOR_NAME='test', GIT_AUTHOR_EMAIL='test@example.com',
+            GIT_COMMITTER_NAME='test', GIT_COMMITTER_EMAIL='test@example.com')
+        if date:
+            env['GIT_AUTHOR_DATE'] = env['GIT_COMMITTER_DATE'] = date
+        subprocess.check_call(('git',) + args, cwd=self.directory, env=env)
+
+    def commit(self, text, date):
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            f.write(text)
+        self.git('add', 'notes.txt')
+        self.git('commit', '-q', '-m', text.strip(), date=date)
+
+    def test_same_second_commits_keep_the_last(self):
+        self.commit('one\n', '1600000000 +0000')
+        self.commit('two\n', '1600000100 +0000')
+        self.commit('three\n', '1600000100 +0000')
+        self.commit('four\n', '1600000100 +0000')
+        self.assertEqual(engine.import_git_history(self.filename), 2)
+        history = engine.get_history(self.filename)
+        self.assertEqual(list(engine.history_timestamps(history)), [1600000000, 1600000100])
+        self.assertEqual(history['1600000000'], 'one\n')
+        self.assertEqual(engine.head(self.filename, history), 'four\n')
+        self.assertEqual(engine.verify(self.filename), [])
+
+    def test_all_commits_in_one_second(self):
+        for text in ('one\n', 'two\n', 'three\n'):
+            self.commit(text, '1600000000 +0000')
+        self.assertEqual(engine.import_git_history(self.filename), 1)
+        history = engine.get_history(self.filename)
+        self.assertEqual(history, { '1600000000': 'three\n' })
+        self.assertEqual(engine.verify(self.filename), [])
+
+if __name__ == '__main__':
+    unittest.main()
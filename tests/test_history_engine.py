@@ -0,0 +1,222 @@
+"""
+Recording, replaying and rewriting a file's _diff history.
+
+    python -m unittest discover tests
+"""
+
+import itertools
+import os
+import random
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_engine import history_engine as engine
+
+
+def edited_states(count, seed=0):
+    """
+    count versions of a small text file, each a few line edits
+    on the one before.
+    """
+    rng = random.Random(seed)
+    lines = ['line %d = %d\n' % (i, rng.randrange(1000)) for i in range(40)]
+    states = [''.join(lines)]
+    for _ in range(count - 1):
+        for _ in range(rng.randint(1, 3)):
+            position = rng.randrange(len(lines))
+            action = rng.random()
+            if action < 0.5:
+                lines[position] = 'line %d = %d\n' % (position, rng.randrange(1000))
+            elif action < 0.8:
+                lines.insert(position, 'new %d\n' % rng.randrange(1000))
+            elif len(lines) > 1:
+                del lines[position]
+        states.append(''.join(lines))
+    return states
+
+
+class HistoryEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'notes.txt')
+        # a snapshot a minute, so no two land in the same second
+        clock = itertools.count(1600000000, 60)
+        self.saved = (
+            engine.time,
+            engine.CHECKPOINT_INTERVAL,
+            engine.MAX_CHECKPOINTS,
+            engine.EXPORT_READ_SIZE)
+        engine.time = types.SimpleNamespace(time=lambda: next(clock))
+
+    def tearDown(self):
+        (engine.time,
+         engine.CHECKPOINT_INTERVAL,
+         engine.MAX_CHECKPOINTS,
+         engine.EXPORT_READ_SIZE) = self.saved
+        shutil.rmtree(self.directory)
+        engine.state_checkpoints.clear()
+        engine.comparison_cache.clear()
+
+    def record(self, states):
+        """
+        Record each state, returning {timestamp: state}.
+        """
+        recorded = {}
+        for state in states:
+            engine.record(self.filename, state)
+            history = engine.get_history(self.filename)
+            recorded[engine.history_timestamps(history)[-1]] = state
+        return recorded
+
+    def test_state_at_round_trip(self):
+        engine.CHECKPOINT_INTERVAL = 4
+        engine.MAX_CHECKPOINTS = 3
+        recorded = self.record(edited_states(40))
+        self.assertEqual(len(recorded), 40)
+        history = engine.get_history(self.filename)
+        timestamps = sorted(recorded)
+        shuffled = list(timestamps)
+        random.Random(1).shuffle(shuffled)
+        for timestamp in shuffled:
+            self.assertEqual(engine.state_at(self.filename, timestamp, history), recorded[timestamp])
+            # between snapshots is the one before
+            self.assertEqual(engine.state_at(self.filename, timestamp + 30, history), recorded[timestamp])
+        self.assertEqual(engine.head(self.filename, history), recorded[timestamps[-1]])
+        checkpoints = engine.state_checkpoints[self.filename][1]
+        self.assertLessEqual(len(checkpoints), engine.MAX_CHECKPOINTS + 2)
+        with self.assertRaises(ValueError):
+            engine.state_at(self.filename, timestamps[0] - 1, history)
+
+    def test_recording_onto_cached_checkpoints(self):
+        engine.CHECKPOINT_INTERVAL = 4
+        states = edited_states(20)
+        recorded = self.record(states[:10])
+        self.assertEqual(engine.head(self.filename), states[9])
+        recorded.update(self.record(states[10:]))
+        history = engine.get_history(self.filename)
+        self.assertEqual(engine.head(self.filename, history), states[-1])
+        for timestamp in reversed(sorted(recorded)):
+            self.assertEqual(engine.state_at(self.filename, timestamp, history), recorded[timestamp])
+
+    def test_unchanged_contents_are_not_recorded(self):
+        states = edited_states(3)
+        self.record(states + [states[-1]])
+        self.assertEqual(len(engine.get_history(self.filename)), 3)
+
+    def test_changes_between_is_cached(self):
+        recorded = self.record(edited_states(5))
+        timestamps = sorted(recorded)
+        diffs = engine.changes_between(self.filename, timestamps[0], timestamps[3])
+        self.assertEqual(''.join(text for op, text in diffs if op != 1), recorded[timestamps[0]])
+        self.assertEqual(''.join(text for op, text in diffs if op != -1), recorded[timestamps[3]])
+        # times between snapshots resolve to the same comparison
+        self.assertIs(
+            engine.changes_between(self.filename, timestamps[0] + 1, timestamps[3] + 1),
+            diffs)
+        self.assertEqual(len(engine.comparison_cache), 1)
+
+    def test_compact_keeps_retained_states(self):
+        recorded = self.record(edited_states(30))
+        timestamps = sorted(recorded)
+        keep_after = timestamps[-5]
+        before, after = engine.compact(self.filename, keep_after, 600, dry_run=True)
+        self.assertEqual(len(engine.get_history(self.filename)), 30)
+        self.assertEqual(engine.compact(self.filename, keep_after, 600), (before, after))
+        self.assertEqual(before, 30)
+        self.assertLess(after, before)
+        history = engine.get_history(self.filename)
+        kept = list(engine.history_timestamps(history))
+        self.assertEqual(len(kept), after)
+        self.assertEqual(kept[0], timestamps[0])
+        self.assertEqual(kept[-5:], timestamps[-5:])
+        for timestamp in kept:
+            self.assertEqual(engine.state_at(self.filename, timestamp, history), recorded[timestamp])
+        self.assertEqual(engine.verify(self.filename), [])
+
+    def test_verify_reports_bad_records(self):
+        recorded = self.record(edited_states(5))
+        timestamps = sorted(recorded)
+        self.assertEqual(engine.verify(self.filename), [])
+        history = engine.get_history(self.filename)
+        history[str(timestamps[0])] = 'something else entirely\n'
+        engine.write_history(self.filename, history)
+        problems = engine.verify(self.filename)
+        self.assertTrue(problems)
+        self.assertEqual(problems[0], '%d: content hash mismatch' % timestamps[0])
+
+    def test_iter_history_records_in_small_reads(self):
+        # escapes and surrogate pairs split across every read
+        states = [
+            'plain text\n',
+            'with "quotes" and \\backslashes\\\n\ttabbed\n',
+            'astral \U0001F600 and \U0001D518\U0001D52B\n\ttabbed\n',
+            'été \U0001F680 "done"\n']
+        self.record(states)
+        history = engine.get_history(self.filename)
+        for read_size in (1, 2, 3, 7):
+            engine.EXPORT_READ_SIZE = read_size
+            self.assertEqual(
+                list(engine.iter_history_records(self.filename)),
+                list(history.items()))
+        self.assertEqual(
+            [state for timestamp, state in engine.iter_history_states(self.filename)],
+            states)
+
+    def test_position_map_against_diff(self):
+        states = edited_states(12, seed=3)
+        dmp = engine.patcher()
+        for old, new in zip(states, states[1:]):
+            diffs = dmp.diff_main(old, new)
+            display = engine.diffs_to_display(diffs)[0]
+            position_map = engine.PositionMap()
+            position = 0
+            for op, text in diffs:
+                if op == 1:
+                    position_map.add_insertion(position, len(text))
+                    position += len(text)
+                elif op == -1:
+                    position_map.add_deletion(position, len(text))
+                else:
+                    position += len(text)
+            position = 0
+            old_position = 0
+            for op, text in diffs:
+                if op == -1:
+                    old_position += len(text)
+                    continue
+                for offset in range(position, position + len(text)):
+                    self.assertEqual(display[position_map.to_display(offset)], new[offset])
+                    if op == 0:
+                        self.assertEqual(position_map.to_previous(offset), old_position + offset - position)
+                    else: # inserted text maps to where it went in
+                        self.assertEqual(position_map.to_previous(offset), old_position)
+                position += len(text)
+                if op == 0:
+                    old_position += len(text)
+
+    def test_iter_region_history(self):
+        recorded = self.record([
+            'header\nalpha = 1\nfooter\n',
+            'header\nalpha = 2\nfooter\n',
+            'header\nmore header\nalpha = 2\nfooter\n',
+            'header\nmore header\nalpha = 2\nfooter changed\n',
+            'header\nmore header\nalpha = 3\nfooter changed\n'])
+        timestamps = sorted(recorded)
+        history = engine.get_history(self.filename)
+        head = engine.head(self.filename, history)
+        start = head.index('alpha')
+        region = (start, head.index('\n', start))
+        self.assertEqual(
+            list(engine.iter_region_history(history, head, region)),
+            [(str(timestamps[4]), 'alpha = 3'),
+             (str(timestamps[1]), 'alpha = 2'),
+             (str(timestamps[0]), 'alpha = 1')])
+
+if __name__ == '__main__':
+    unittest.main()